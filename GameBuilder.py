@@ -1,5 +1,10 @@
 import pygame
 import json
+import math
+import array
+from dataclasses import dataclass, field
+
+from geom import ray_tracing
 
 # Initialize Pygame
 pygame.init()
@@ -15,69 +20,230 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 
+CIRCLE_SEGMENTS = 64 # Perimeter points used when a circle is drawn as a polygon
+SELECTION_WIDTH = 2 # Line width of the selected shape's highlight outline
+
+# --- Circle Helper ---
+def circle_vertices(center, radius, segments=CIRCLE_SEGMENTS):
+    """Perimeter points of a circle using the tangential/radial factor recurrence (one tan/cos total, no per-point trig)."""
+    theta = 2 * math.pi / segments
+    tangential_factor = math.tan(theta); radial_factor = math.cos(theta)
+    cx, cy = center; x = radius; y = 0.0
+    points = []
+    for _ in range(segments):
+        points.append((cx + x, cy + y))
+        tx = -y; ty = x # Tangent to the circle at (x, y)
+        x = (x + tx * tangential_factor) * radial_factor
+        y = (y + ty * tangential_factor) * radial_factor
+    return points
+
+# --- Dirty Rect Helper ---
+def points_rect(points, pad=0):
+    """Bounding pygame.Rect around a list of (x, y) points, grown by pad on every side."""
+    xs = [p[0] for p in points]; ys = [p[1] for p in points]
+    left = min(xs) - pad; top = min(ys) - pad
+    return pygame.Rect(left, top, max(xs) - left + pad + 1, max(ys) - top + pad + 1)
+
+def flat_points(coords):
+    """(x, y) tuples of a flat x0, y0, x1, y1... coordinate array."""
+    return list(zip(coords[0::2], coords[1::2]))
+
 # --- Shape Class (Illustrative - very basic start) ---
 class Shape:
     def __init__(self, shape_type, vertices, color=WHITE):
         self.shape_type = shape_type
         self.vertices = vertices  # List of tuples [(x1, y1), (x2, y2), ...]
         self.color = color
-
-    def draw(self, surface):
-        if self.shape_type == "polygon":
-            if len(self.vertices) > 2: # Polygon needs at least 3 vertices
-                pygame.draw.polygon(surface, self.color, self.vertices)
-        elif self.shape_type == "circle": # Assuming circle vertices = [(center_x, center_y), radius]
-            if len(self.vertices) == 2:
-                pygame.draw.circle(surface, self.color, self.vertices[0], self.vertices[1])
+        self._circle_vertices = None
+        # Screen area covered by the shape, computed once (used for dirty rect redraws)
+        if shape_type == "circle" and len(vertices) == 2:
+            (cx, cy), r = vertices; self.rect = pygame.Rect(cx - r, cy - r, 2 * r + 1, 2 * r + 1)
+            self._circle_vertices = circle_vertices((cx, cy), r) # Perimeter precomputed once
+        else: self.rect = points_rect(vertices)
+        # Pre-rasterized copy of the shape, built on first draw and blitted afterwards
+        self._cached_surface = None
+        self._cached_offset = None
+        # Bind the type-specific outline drawer once so drawing never compares shape_type
+        self._draw_outline = self._draw_circle if shape_type == "circle" else self._draw_polygon
+
+    def _rasterize(self):
+        """Draws the shape once into a surface the size of its bounding rect."""
+        left, top = self.rect.topleft
+        if self.color != BLACK:
+            # Opaque shape: colorkey blits are cheaper than per-pixel alpha
+            cached = pygame.Surface(self.rect.size); cached.fill(BLACK); cached.set_colorkey(BLACK)
+        else:
+            cached = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self._draw_outline(cached, left, top)
+        self._cached_surface = cached.convert() if self.color != BLACK else cached.convert_alpha()
+        self._cached_offset = (left, top)
+
+    def _draw_polygon(self, target, left, top):
+        assert len(self.vertices) > 2, "Polygon needs at least 3 vertices"
+        pygame.draw.polygon(target, self.color, [(x - left, y - top) for x, y in self.vertices])
+
+    def _draw_circle(self, target, left, top): # Assuming circle vertices = [(center_x, center_y), radius]
+        assert self._circle_vertices, "Circle needs [(center_x, center_y), radius]"
+        pygame.draw.polygon(target, self.color, [(x - left, y - top) for x, y in self._circle_vertices])
+
+# --- Shape Storage (structure-of-arrays) ---
+class ShapeBuffer:
+    """
+    Holds every committed shape's outline in flat, contiguous arrays (CSR-style):
+    the vertices of shape i are [offsets[i], offsets[i + 1]) in vertices_x / vertices_y.
+    The Shape objects are kept alongside for their cached surfaces and rects.
+    """
+    def __init__(self):
+        self.vertices_x = array.array('h'); self.vertices_y = array.array('h') # Screen coords fit in int16
+        self.offsets = array.array('i', [0])
+        self.shapes = []
+        # Type-partitioned views filled at insert time, so rendering never branches on shape_type
+        self.polygons = []; self.circles = []
+
+    def __len__(self): return len(self.shapes)
+    def __iter__(self): return iter(self.shapes)
+
+    def add_shape(self, shape, flat_coords=None):
+        """Appends shape. flat_coords, an array('h') of x0, y0, x1, y1..., is copied in C instead of converting each vertex."""
+        if shape.shape_type == "circle": outline = shape._circle_vertices; self.circles.append(shape)
+        else: outline = shape.vertices; self.polygons.append(shape)
+        if flat_coords is not None: self.vertices_x.extend(flat_coords[0::2]); self.vertices_y.extend(flat_coords[1::2])
+        else:
+            for x, y in outline: self.vertices_x.append(int(x)); self.vertices_y.append(int(y))
+        self.offsets.append(len(self.vertices_x))
+        self.shapes.append(shape)
+
+    def outline(self, i):
+        """Vertex list of shape i, rebuilt from the flat arrays."""
+        start = self.offsets[i]; end = self.offsets[i + 1]
+        return list(zip(self.vertices_x[start:end], self.vertices_y[start:end]))
+
+    def blit_sequence(self, area):
+        """(surface, position) pairs for every shape touching area, for a single Surface.blits call. Polygons draw below circles."""
+        pairs = []
+        for bucket in (self.polygons, self.circles):
+            for shape in bucket:
+                if shape.rect.colliderect(area):
+                    if shape._cached_surface is None: shape._rasterize()
+                    pairs.append((shape._cached_surface, shape._cached_offset))
+        return pairs
+
+    def shape_at(self, pos):
+        """Index of the topmost shape containing pos, or None. Rect check first, then ray casting on the flat arrays."""
+        x, y = pos
+        for i in range(len(self.shapes) - 1, -1, -1):
+            if self.shapes[i].rect.collidepoint(x, y) and ray_tracing(x, y, self.vertices_x, self.vertices_y, self.offsets[i], self.offsets[i + 1]):
+                return i
+        return None
+
+# --- Aggregated Input (filled during the event drain, applied once per frame) ---
+@dataclass
+class InputState:
+    clicks: list = field(default_factory=list) # Left-click positions this frame
+    select_clicks: list = field(default_factory=list) # Right-click positions this frame
+    enter_pressed: bool = False
+    quit: bool = False
 
 # --- Editor State ---
 editing = True
-shapes = []  # List to hold shapes in the level
+shapes = ShapeBuffer()  # Holds the shapes in the level
 current_shape_type_to_add = "polygon"  # "polygon", "circle", etc. (for editor UI to set)
-drawing_polygon_points = [] # List of points for the currently drawn polygon
+drawing_polygon_coords = array.array('h') # Flat x0, y0, x1, y1... of the currently drawn polygon
+selected_shape_index = None # Index into shapes of the right-clicked shape
+selected_outline = None; selected_rect = None # Its outline (from the flat vertex arrays) and the screen area the highlight covers
+
 
+# --- Event Filtering ---
+# The editor only reacts to clicks, key presses and quit; drop the rest at the SDL layer
+pygame.event.set_blocked([pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP, pygame.KEYUP, pygame.ACTIVEEVENT])
+clock = pygame.time.Clock()
+IDLE_WAIT_MS = 15 # How long to block for input when nothing needs redrawing
+
+# --- Hot Loop Aliases (one name lookup per call instead of module + attribute lookups) ---
+event_pump = pygame.event.pump; event_get = pygame.event.get; event_wait = pygame.event.wait
+draw_lines = pygame.draw.lines; draw_circle = pygame.draw.circle; display_update = pygame.display.update
+screen_fill = screen.fill; screen_set_clip = screen.set_clip; screen_blits = screen.blits
+QUIT = pygame.QUIT; MOUSEBUTTONDOWN = pygame.MOUSEBUTTONDOWN; KEYDOWN = pygame.KEYDOWN; K_RETURN = pygame.K_RETURN; NOEVENT = pygame.NOEVENT
 
 # --- Game Loop (Basic Editor Loop) ---
 running = True
+dirty_rects = [screen.get_rect()] # Screen areas that changed since the last display update
 while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        if editing:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1: # Left mouse click
-                    if current_shape_type_to_add == "polygon":
-                        drawing_polygon_points.append(event.pos)
-                    # ... (Handle other shape types, selection, dragging, etc. later)
-
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN: # Example: Finish polygon with Enter key
-                    if drawing_polygon_points:
-                        new_shape = Shape("polygon", drawing_polygon_points, GREEN)
-                        shapes.append(new_shape)
-                        drawing_polygon_points = [] # Start a new polygon next time
-
-
-    # --- Update Editor State (Add logic here to handle shape selection, manipulation) ---
-
-
-    # --- Drawing ---
-    screen.fill(BLACK) # Clear screen
-
-    # Draw all shapes
-    for shape in shapes:
-        shape.draw(screen)
-
-    if drawing_polygon_points: # Draw lines to indicate polygon being drawn
-        if len(drawing_polygon_points) > 1:
-            pygame.draw.lines(screen, WHITE, False, drawing_polygon_points)
-        if drawing_polygon_points: # Draw a small circle for the current point
-            pygame.draw.circle(screen, WHITE, drawing_polygon_points[-1], 4)
+    # Pump once, then drain everything queued this frame in a single batch
+    event_pump()
+    events = event_get(pump=False)
+    if not events and not dirty_rects:
+        # Editor is idle: sleep on the queue instead of spinning
+        event = event_wait(IDLE_WAIT_MS)
+        if event.type != NOEVENT: events = [event]
+
+    # --- 1. Aggregate Input (no editor state is touched here) ---
+    frame_input = InputState()
+    for event in events:
+        if event.type == QUIT:
+            frame_input.quit = True
+        elif event.type == MOUSEBUTTONDOWN and event.button == 1: # Left mouse click
+            frame_input.clicks.append(event.pos)
+        elif event.type == MOUSEBUTTONDOWN and event.button == 3: # Right click selects
+            frame_input.select_clicks.append(event.pos)
+        elif event.type == KEYDOWN and event.key == K_RETURN: # Example: Finish polygon with Enter key
+            frame_input.enter_pressed = True
+
+    # --- 2. Apply Input to Editor State (Add logic here to handle shape selection, manipulation) ---
+    if frame_input.quit:
+        running = False
+
+    if editing:
+        if current_shape_type_to_add == "polygon" and frame_input.clicks:
+            for x, y in frame_input.clicks: drawing_polygon_coords.append(x); drawing_polygon_coords.append(y)
+            dirty_rects.append(points_rect(flat_points(drawing_polygon_coords), pad=5)) # Covers the in-progress lines and point marker
+        # ... (Handle other shape types, dragging, etc. later)
+
+        if frame_input.select_clicks:
+            new_index = shapes.shape_at(frame_input.select_clicks[-1])
+            if new_index != selected_shape_index:
+                if selected_rect: dirty_rects.append(selected_rect) # Erase the old highlight
+                selected_shape_index = new_index
+                if new_index is None: selected_outline = None; selected_rect = None
+                else:
+                    selected_outline = shapes.outline(new_index); selected_rect = shapes.shapes[new_index].rect.inflate(2 * SELECTION_WIDTH + 2, 2 * SELECTION_WIDTH + 2)
+                    dirty_rects.append(selected_rect)
+
+        if frame_input.enter_pressed and drawing_polygon_coords:
+            drawn_points = flat_points(drawing_polygon_coords)
+            if len(drawn_points) > 2: # Polygon needs at least 3 vertices, fewer are discarded
+                new_shape = Shape("polygon", drawn_points, GREEN)
+                shapes.add_shape(new_shape, drawing_polygon_coords)
+            dirty_rects.append(points_rect(drawn_points, pad=5)) # Also erases the in-progress lines and point marker
+            drawing_polygon_coords = array.array('h') # Start a new polygon next time
+
+
+    # --- 3. Drawing (only the dirty areas are cleared, redrawn and pushed to the display) ---
+    if not dirty_rects:
+        continue
+    in_progress_points = flat_points(drawing_polygon_coords) # In-progress outline, built once per redrawn frame
+    for rect in dirty_rects:
+        screen_set_clip(rect)
+        screen_fill(BLACK, rect) # Clear dirty area
+
+        # Draw the shapes touching this area in one C-level batch
+        screen_blits(shapes.blit_sequence(rect), doreturn=False)
+
+        if selected_outline and selected_rect.colliderect(rect): # Highlight the right-clicked shape
+            draw_lines(screen, RED, True, selected_outline, SELECTION_WIDTH)
+
+        if in_progress_points: # Draw lines to indicate polygon being drawn
+            if len(in_progress_points) > 1:
+                draw_lines(screen, WHITE, False, in_progress_points)
+            if in_progress_points: # Draw a small circle for the current point
+                draw_circle(screen, WHITE, in_progress_points[-1], 4)
+    screen_set_clip(None)
 
     # ... Draw editor UI elements (buttons, text, etc. later)
 
-    pygame.display.flip() # Update the display
+    display_update(dirty_rects) # Update only the changed areas of the display
+    dirty_rects = []
+    clock.tick(60) # Cap the editor frame rate
 
 
 pygame.quit()
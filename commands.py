@@ -1,4 +1,6 @@
 # commands.py
+import logging
+import weakref
 from abc import ABC, abstractmethod
 from pymunk import Vec2d
 from typing import TYPE_CHECKING, List, Tuple, Optional
@@ -7,6 +9,9 @@ if TYPE_CHECKING:
     from shape import Shape
     from states.editor_state import EditorState
 
+# Command tracing goes through logging so disabled debug output costs no string formatting
+log = logging.getLogger(__name__)
+
 class Command(ABC):
     """Abstract base class for all undoable commands."""
     def __init__(self, editor_state: 'EditorState'):
@@ -18,25 +23,41 @@ class Command(ABC):
     @abstractmethod
     def undo(self): pass
 
+class UndoneCommand(Command):
+    """History marker for a command that was undone before a new edit: executing it undoes the wrapped command, undoing it re-applies it."""
+    def __init__(self, command: Command):
+        super().__init__(command.editor_state); self.command = command
+
+    def execute(self): log.debug("CMD: Replay undo of %s", type(self.command).__name__); self.command.undo()
+    def undo(self): log.debug("CMD: Reapply %s", type(self.command).__name__); self.command.execute()
+
 # --- Shape Commands ---
 class PlaceShapeCommand(Command):
     def __init__(self, editor_state: 'EditorState', shape_data):
         super().__init__(editor_state)
         self.shape_data = shape_data
-        self.created_shape_object = None
+        self._created_shape_ref = None # Weak: the world owns the shape, history must not keep it alive
+
+    @property
+    def created_shape_object(self) -> Optional['Shape']:
+        return self._created_shape_ref() if self._created_shape_ref else None
+
+    @created_shape_object.setter
+    def created_shape_object(self, shape_obj: Optional['Shape']):
+        self._created_shape_ref = weakref.ref(shape_obj) if shape_obj else None
 
     def execute(self):
         self.created_shape_object = self.game_world.add_shape(self.shape_data)
         if self.created_shape_object:
-            print(f"CMD: Placed {self.created_shape_object.shape_type} at {self.shape_data['position']}")
+            log.debug("CMD: Placed %s at %s", self.created_shape_object.shape_type, self.shape_data['position'])
             self.editor_state.select_shape(self.created_shape_object)
         else:
-            print("CMD Error: Place failed.")
+            log.error("CMD Error: Place failed.")
 
     def undo(self):
         if self.created_shape_object:
             shape_pos = getattr(self.created_shape_object.body, 'position', 'N/A')
-            print(f"CMD: Undoing place {shape_pos}")
+            log.debug("CMD: Undoing place %s", shape_pos)
             was_selected = (self.editor_state.selected_shape == self.created_shape_object)
             self.game_world.remove_shape(self.created_shape_object)
             self.created_shape_object = None
@@ -47,43 +68,50 @@ class DeleteShapeCommand(Command):
     def __init__(self, editor_state: 'EditorState', shape_to_delete: 'Shape'):
         super().__init__(editor_state); assert shape_to_delete is not None
         self.deleted_shape_object_ref = shape_to_delete
-        pos = getattr(shape_to_delete.body, 'position', Vec2d(0,0)); ang = getattr(shape_to_delete.body, 'angle', 0.0)
-        self.shape_data={'type':shape_to_delete.shape_type,'position':pos.int_tuple,'angle':ang,'properties':shape_to_delete.properties.copy(),'size':shape_to_delete.size.int_tuple if shape_to_delete.size else None,'radius':shape_to_delete.radius if shape_to_delete.radius is not None else None,'vertices':shape_to_delete.vertices if shape_to_delete.vertices else None,'scale':getattr(shape_to_delete,'scale',1.0)}
-        print(f"CMD: Prepare delete {self.shape_data['position']}")
+        self.shape_data = None # Snapshot for undo, taken in execute right before removal
+        log.debug("CMD: Prepare delete %s", shape_to_delete.body.position)
+
+    def _snapshot(self, shape_obj: 'Shape'):
+        body = shape_obj.body; pos = body.position
+        pos_tuple = (round(pos.x), round(pos.y)) # Same values as pos.int_tuple
+        return {'type':shape_obj.shape_type,'position':pos_tuple,'angle':body.angle,'properties':shape_obj.properties.copy(),'size':shape_obj.size.int_tuple if shape_obj.size else None,'radius':shape_obj.radius if shape_obj.radius is not None else None,'vertices':shape_obj.vertices if shape_obj.vertices else None,'scale':getattr(shape_obj,'scale',1.0)}
 
     def execute(self):
         shape_to_remove=self.deleted_shape_object_ref
-        if shape_to_remove in self.game_world.shapes:
-            shape_pos = shape_to_remove.body.position; print(f"CMD: Deleting {shape_pos}")
+        if shape_to_remove is not None and self.game_world.has_shape(shape_to_remove):
+            self.shape_data = self._snapshot(shape_to_remove)
+            log.debug("CMD: Deleting %s", self.shape_data['position'])
             was_selected=(self.editor_state.selected_shape==shape_to_remove)
             self.game_world.remove_shape(shape_to_remove)
             if was_selected: self.editor_state.select_shape(None)
-        else: print("CMD Warning: Shape to delete was already removed or invalid.")
+        else: log.warning("CMD Warning: Shape to delete was already removed or invalid.")
+        self.deleted_shape_object_ref = None # Undo rebuilds from shape_data, don't keep the removed shape alive
 
     def undo(self):
-        print(f"CMD: Undoing delete {self.shape_data['position']}")
+        if self.shape_data is None: log.warning("CMD Warning: Nothing to restore, delete never ran."); return
+        log.debug("CMD: Undoing delete %s", self.shape_data['position'])
         recreated_shape=self.game_world.add_shape(self.shape_data)
         if recreated_shape: self.deleted_shape_object_ref = recreated_shape
-        else: print("CMD Error: Failed to recreate shape on undo.")
+        else: log.error("CMD Error: Failed to recreate shape on undo.")
 
 
 class MoveShapeCommand(Command):
      def __init__(self, editor_state: 'EditorState', shape_to_move: 'Shape', start_pos: Vec2d, end_pos: Vec2d):
         super().__init__(editor_state); assert shape_to_move is not None
         self.shape_moved = shape_to_move; self.start_pos = start_pos; self.end_pos = end_pos
-        print(f"CMD: Prepare move {start_pos} -> {end_pos}")
+        log.debug("CMD: Prepare move %s -> %s", start_pos, end_pos)
 
      def execute(self):
         if self.shape_moved and self.shape_moved.body:
-            print(f"CMD: Moving to {self.end_pos}"); self.shape_moved.body.position = self.end_pos
-            self.game_world.space.reindex_shapes_for_body(self.shape_moved.body)
-        else: print("CMD Warning: Shape to move no longer valid.")
+            log.debug("CMD: Moving to %s", self.end_pos); self.shape_moved.body.position = self.end_pos
+            self.game_world.reindex_shape(self.shape_moved)
+        else: log.warning("CMD Warning: Shape to move no longer valid.")
 
      def undo(self):
         if self.shape_moved and self.shape_moved.body:
-            print(f"CMD: Undoing move to {self.start_pos}"); self.shape_moved.body.position = self.start_pos
-            self.game_world.space.reindex_shapes_for_body(self.shape_moved.body)
-        else: print("CMD Warning: Shape to undo move no longer valid.")
+            log.debug("CMD: Undoing move to %s", self.start_pos); self.shape_moved.body.position = self.start_pos
+            self.game_world.reindex_shape(self.shape_moved)
+        else: log.warning("CMD Warning: Shape to undo move no longer valid.")
 
 
 # --- CORRECTED TogglePropertyCommand ---
@@ -92,27 +120,27 @@ class TogglePropertyCommand(Command):
         super().__init__(editor_state); assert shape_instance is not None
         self.shape_instance = shape_instance; self.prop_name = prop_name
         self.previous_value = shape_instance.properties.get(prop_name, False); self.new_value = not self.previous_value
-        pos = getattr(shape_instance.body, 'position', 'N/A'); print(f"CMD: Prepare toggle {prop_name} for {pos} {self.previous_value}->{self.new_value}")
+        pos = shape_instance.body.position; log.debug("CMD: Prepare toggle %s for %s %s->%s", prop_name, pos, self.previous_value, self.new_value)
 
      def execute(self):
         if self.shape_instance:
-            print(f"CMD: Toggle {self.prop_name} -> {self.new_value}")
-            self.shape_instance.set_property(self.prop_name, self.new_value, self.game_world.space)
+            log.debug("CMD: Toggle %s -> %s", self.prop_name, self.new_value)
+            self.shape_instance.set_property(self.prop_name, self.new_value, self.game_world.space); self.game_world.mark_shapes_moved()
             # --- REMOVED line trying to access toolbar.current_properties ---
             # if self.editor_state.selected_shape == self.shape_instance:
             #     self.editor_state.toolbar.current_properties[self.prop_name] = self.new_value
         else:
-            print("CMD Warning: Shape to toggle property no longer valid.")
+            log.warning("CMD Warning: Shape to toggle property no longer valid.")
 
      def undo(self):
         if self.shape_instance:
-            print(f"CMD: Undoing toggle {self.prop_name} -> {self.previous_value}")
-            self.shape_instance.set_property(self.prop_name, self.previous_value, self.game_world.space)
+            log.debug("CMD: Undoing toggle %s -> %s", self.prop_name, self.previous_value)
+            self.shape_instance.set_property(self.prop_name, self.previous_value, self.game_world.space); self.game_world.mark_shapes_moved()
             # --- REMOVED line trying to access toolbar.current_properties ---
             # if self.editor_state.selected_shape == self.shape_instance:
             #     self.editor_state.toolbar.current_properties[self.prop_name] = self.previous_value
         else:
-             print("CMD Warning: Shape to undo toggle no longer valid.")
+             log.warning("CMD Warning: Shape to undo toggle no longer valid.")
 # --- End Correction ---
 
 
@@ -121,78 +149,73 @@ class ResizeShapeCommand(Command):
         super().__init__(editor_state); assert shape_instance is not None
         self.shape_instance = shape_instance; self.new_params = new_params.copy()
         self.old_params = self._get_current_params(shape_instance)
-        self.old_position = Vec2d(shape_instance.body.position.x, shape_instance.body.position.y)
+        self.old_position = shape_instance.body.position # Vec2d is immutable, no copy needed
         self.old_angle = shape_instance.body.angle
         self.new_position = new_params.get('position', self.old_position); self.new_angle = self.old_angle
-        print(f"CMD: Prepare resize shape"); print(f"  Old: Params={self.old_params}, Pos={self.old_position}, Ang={self.old_angle:.2f}"); print(f"  New: Params={self.new_params}, Pos={self.new_position}, Ang={self.new_angle:.2f}")
+        log.debug("CMD: Prepare resize shape"); log.debug("  Old: Params=%s, Pos=%s, Ang=%.2f", self.old_params, self.old_position, self.old_angle); log.debug("  New: Params=%s, Pos=%s, Ang=%.2f", self.new_params, self.new_position, self.new_angle)
 
     def _get_current_params(self, shape_obj):
         if shape_obj.shape_type == 'Circle': return {'radius': shape_obj.radius}
-        elif shape_obj.shape_type == 'Rectangle': return {'size': Vec2d(shape_obj.size.x, shape_obj.size.y)}
+        elif shape_obj.shape_type == 'Rectangle': return {'size': shape_obj.size}
         elif shape_obj.shape_type == 'Triangle': return {'scale': shape_obj.scale}
         else: return {}
 
     def execute(self):
         if self.shape_instance:
-            print(f"CMD: Resizing shape to {self.new_params} at pos {self.new_position}")
-            success = self.shape_instance.resize(self.new_params, self.game_world.space, new_pos=self.new_position, new_angle=self.new_angle)
-            if not success: print("CMD Error: Shape resize failed.")
-        else: print("CMD Warning: Shape to resize no longer valid.")
+            log.debug("CMD: Resizing shape to %s at pos %s", self.new_params, self.new_position)
+            success = self.shape_instance.resize(self.new_params, self.game_world.space, new_pos=self.new_position, new_angle=self.new_angle); self.game_world.mark_shapes_moved()
+            if not success: log.error("CMD Error: Shape resize failed.")
+        else: log.warning("CMD Warning: Shape to resize no longer valid.")
 
     def undo(self):
         if self.shape_instance:
-            print(f"CMD: Undoing resize, restoring to {self.old_params} at pos {self.old_position}")
-            success = self.shape_instance.resize(self.old_params, self.game_world.space, new_pos=self.old_position, new_angle=self.old_angle)
-            if not success: print("CMD Error: Shape resize undo failed.")
-        else: print("CMD Warning: Shape to undo resize no longer valid.")
+            log.debug("CMD: Undoing resize, restoring to %s at pos %s", self.old_params, self.old_position)
+            success = self.shape_instance.resize(self.old_params, self.game_world.space, new_pos=self.old_position, new_angle=self.old_angle); self.game_world.mark_shapes_moved()
+            if not success: log.error("CMD Error: Shape resize undo failed.")
+        else: log.warning("CMD Warning: Shape to undo resize no longer valid.")
 
 
 # --- Marker / Checkpoint Commands ---
 class SetMarkerCommand(Command):
     def __init__(self, editor_state: 'EditorState', marker_type: str, new_pos: Optional[Vec2d]):
         super().__init__(editor_state); assert marker_type in ['start', 'end']
-        self.marker_type = marker_type; self.new_pos = Vec2d(new_pos.x, new_pos.y) if new_pos else None
-        self.old_pos = getattr(self.game_world, f"{marker_type}_marker", None); self.old_pos = Vec2d(self.old_pos.x, self.old_pos.y) if self.old_pos else None
-        print(f"CMD: Prepare set {marker_type}: {self.old_pos} -> {self.new_pos}")
+        # Vec2d is immutable, so positions are stored by reference rather than copied
+        self.marker_type = marker_type; self.new_pos = new_pos
+        self.old_pos = getattr(self.game_world, f"{marker_type}_marker", None)
+        log.debug("CMD: Prepare set %s: %s -> %s", marker_type, self.old_pos, self.new_pos)
 
-    def execute(self): print(f"CMD: Set {self.marker_type} -> {self.new_pos}"); setattr(self.game_world, f"{self.marker_type}_marker", self.new_pos)
-    def undo(self): print(f"CMD: Undo set {self.marker_type} -> {self.old_pos}"); setattr(self.game_world, f"{self.marker_type}_marker", self.old_pos)
+    def execute(self): log.debug("CMD: Set %s -> %s", self.marker_type, self.new_pos); setattr(self.game_world, f"{self.marker_type}_marker", self.new_pos)
+    def undo(self): log.debug("CMD: Undo set %s -> %s", self.marker_type, self.old_pos); setattr(self.game_world, f"{self.marker_type}_marker", self.old_pos)
 
 class AddCheckpointCommand(Command):
     def __init__(self, editor_state: 'EditorState', position: Vec2d):
-        super().__init__(editor_state); self.position = Vec2d(position.x, position.y); self.added_checkpoint = None
+        super().__init__(editor_state); self.position = position; self.added_checkpoint = None
 
     def execute(self):
-        print(f"CMD: Add checkpoint {self.position}"); self.added_checkpoint = self.position
-        self.game_world.checkpoints.append(self.added_checkpoint); print(f"CP count: {len(self.game_world.checkpoints)}")
+        log.debug("CMD: Add checkpoint %s", self.position); self.added_checkpoint = self.position
+        self.game_world.add_checkpoint(self.added_checkpoint); log.debug("CP count: %s", len(self.game_world.checkpoints))
 
     def undo(self):
-        print(f"CMD: Undo add checkpoint {self.position}")
-        if self.added_checkpoint in self.game_world.checkpoints:
-             self.game_world.checkpoints.remove(self.added_checkpoint); print(f"CP count: {len(self.game_world.checkpoints)}")
-             if self.game_world.last_checkpoint_activated == self.added_checkpoint: self.game_world.last_checkpoint_activated = None
-        else: print(f"CMD Warning: Could not find checkpoint {self.added_checkpoint} to remove.")
+        log.debug("CMD: Undo add checkpoint %s", self.position)
+        removed_index, _ = self.game_world.remove_checkpoint(self.added_checkpoint) if self.added_checkpoint else (-1, None)
+        if removed_index != -1: log.debug("CP count: %s", len(self.game_world.checkpoints))
+        else: log.warning("CMD Warning: Could not find checkpoint %s to remove.", self.added_checkpoint)
         self.added_checkpoint = None # Clear after remove regardless
 
 
 class RemoveCheckpointCommand(Command):
     def __init__(self, editor_state: 'EditorState', position: Vec2d):
-        super().__init__(editor_state); self.position = Vec2d(position.x, position.y); self.removed_index = -1; self.removed_value = None
+        super().__init__(editor_state); self.position = position; self.removed_index = -1; self.removed_value = None
 
     def execute(self):
-        print(f"CMD: Remove checkpoint near {self.position}"); self.removed_index = -1; self.removed_value = None
-        try:
-            # Find by value equality, store removed value
-            self.removed_value = next(cp for cp in self.game_world.checkpoints if cp == self.position)
-            self.removed_index = self.game_world.checkpoints.index(self.removed_value)
-            self.game_world.checkpoints.pop(self.removed_index)
-            print(f"CMD: Removed {self.removed_value} @{self.removed_index}")
-            if self.game_world.last_checkpoint_activated == self.removed_value: self.game_world.last_checkpoint_activated = None
-        except (ValueError, StopIteration):
-             print(f"CMD Warning: Checkpoint at {self.position} not found for removal.")
+        log.debug("CMD: Remove checkpoint near %s", self.position); self.removed_index = -1; self.removed_value = None
+        # Find by value via the world's checkpoint index, store removed value
+        self.removed_index, self.removed_value = self.game_world.remove_checkpoint(self.position)
+        if self.removed_index != -1: log.debug("CMD: Removed %s @%s", self.removed_value, self.removed_index)
+        else: log.warning("CMD Warning: Checkpoint at %s not found for removal.", self.position)
 
     def undo(self):
         if self.removed_value and self.removed_index != -1:
-            print(f"CMD: Undo remove CP {self.removed_value} @{self.removed_index}"); insert_index = max(0, min(self.removed_index, len(self.game_world.checkpoints)))
-            self.game_world.checkpoints.insert(insert_index, self.removed_value)
-        else: print("CMD Warning: Cannot undo checkpoint removal, state invalid.")
\ No newline at end of file
+            log.debug("CMD: Undo remove CP %s @%s", self.removed_value, self.removed_index)
+            self.game_world.add_checkpoint(self.removed_value, self.removed_index)
+        else: log.warning("CMD Warning: Cannot undo checkpoint removal, state invalid.")
\ No newline at end of file
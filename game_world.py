@@ -1,14 +1,23 @@
 # game_world.py
+import logging
 import pygame
 import pymunk
 from pymunk import Vec2d
 import json
+try:
+    import orjson # Optional C-backed JSON, stdlib json is used when it is missing
+except ImportError:
+    orjson = None
 import os
-import math # Needed for ceil
+import time
+from array import array
 
 # Import the classes we just created
 from player import Player
 from shape import Shape
+from geom import nearest_within, transform_polys
+
+log = logging.getLogger(__name__)
 
 # Constants needed by GameWorld
 # Map Dimensions
@@ -17,8 +26,11 @@ MAP_HEIGHT = 1000
 # Boundary settings
 BOUNDARY_THICKNESS = 10; BOUNDARY_COLOR = (0, 0, 0)
 BOUNDARY_FRICTION = 1.0; BOUNDARY_ELASTICITY = 0.1
+BOUNDARY_DRAW_WIDTH = max(1, int(BOUNDARY_THICKNESS)) # Line width in pixels
 # Collision Types Dictionary
 COLLISION_TYPES = { 'player': 1, 'shape_normal': 2, 'shape_danger': 3, 'boundary': 0 }
+# Fixed physics timestep (seconds), independent of the render frame rate
+PHYSICS_DT = 1.0 / 120.0
 # Player specific constants
 PLAYER_RADIUS = 15
 # Marker/Checkpoint visual constants
@@ -28,8 +40,21 @@ CHECKPOINT_RADIUS = 18
 HEART_IMG = None
 try:
     HEART_IMG = pygame.Surface((24, 24), pygame.SRCALPHA); pygame.draw.circle(HEART_IMG, (255, 0, 0), (12, 12), 10); pygame.draw.circle(HEART_IMG, (200, 0, 0), (12, 12), 10, 2)
-except Exception as e: print(f"Warning: Could not load/create heart image: {e}")
+except Exception as e: log.warning("Could not load/create heart image: %s", e)
+HEART_SPACING = 5 # Gap between hearts in the HUD
 TOOLBAR_HEIGHT = 60 # For UI positioning
+# --- Level File Serialization ---
+def _json_dumps(data):
+    """ Level data -> UTF-8 bytes (indented). Vec2d/tuple subclasses are written as lists either way. """
+    if orjson: return orjson.dumps(data, option=orjson.OPT_INDENT_2, default=list)
+    return json.dumps(data, indent=4).encode('utf-8')
+
+def _json_loads(raw): return orjson.loads(raw) if orjson else json.loads(raw)
+
+# Spatial grid cell size in world units (must exceed the checkpoint activation distance)
+SPATIAL_CELL_SIZE = 200
+
+def _grid_cell(x, y): return (int(x) // SPATIAL_CELL_SIZE, int(y) // SPATIAL_CELL_SIZE)
 
 # --- Parallax Background Constants ---
 # Adjust filenames and paths as needed
@@ -44,19 +69,41 @@ class GameWorld:
     Manages the physics space, game objects (player, shapes), level data,
     collision handling, camera, and drawing the world elements including parallax background.
     """
+    # Fixed attribute layout: no per-instance __dict__, attribute reads in draw/update are slot loads
+    __slots__ = ('screen_width', 'screen_height', 'space', '_phys_accum',
+                 'player', 'shapes', 'start_marker', 'end_marker', '_shape_ids', 'checkpoints', '_checkpoint_index',
+                 '_shape_grid', '_moving_shapes', '_grid_shapes', '_shape_grid_dirty', '_bb_left', '_bb_bottom', '_bb_right', '_bb_top',
+                 '_spin_polys', '_spin_local_x', '_spin_local_y', '_spin_offsets', '_spin_out_x', '_spin_out_y',
+                 '_checkpoint_grid', '_checkpoint_near', 'last_checkpoint_activated', 'camera_offset', '_boundary_segments', '_boundary_corners',
+                 'marker_font', 'checkpoint_font', '_s_glyph', '_e_glyph', '_c_glyph', '_cp_surface_inactive', '_cp_surface_active',
+                 'player_needs_respawn', 'parallax_layers', '_heart_strip', '_cam_max_x', '_cam_max_y')
+
     def __init__(self, screen_width, screen_height):
         self.screen_width = screen_width
         self.screen_height = screen_height
 
         # Physics Space
-        self.space = pymunk.Space(); self.space.gravity = (0, 0); self.space.iterations = 15
+        self.space = pymunk.Space(); self.space.gravity = (0, 0); self.space.iterations = 10 # Fewer solver iterations, the fixed substeps keep contacts stable
+        self._phys_accum = 0.0 # Frame time not yet simulated, stepped off in PHYSICS_DT chunks
 
         # Game Objects & Level Data
         self.player = None; self.shapes = []; self.start_marker = None; self.end_marker = None
+        self._shape_ids = {}     # id(shape) -> Shape, for O(1) membership checks
         self.checkpoints = []    # List of Vec2d world coordinates
+        self._checkpoint_index = {} # exact (x, y) -> Vec2d, for O(1) checkpoint lookup (rounded keys would collide for nearby checkpoints)
+
+        # Spatial grids (cell -> objects) so culling/activation only look at nearby cells
+        self._shape_grid = {}; self._moving_shapes = []; self._grid_shapes = []; self._shape_grid_dirty = True
+        self._bb_left = array('d'); self._bb_bottom = array('d'); self._bb_right = array('d'); self._bb_top = array('d') # Per gridded shape (SoA)
+        # Spinning polygons' local vertices (CSR: polygon k is [offsets[k], offsets[k + 1])), transformed together once per frame
+        self._spin_polys = []; self._spin_local_x = array('d'); self._spin_local_y = array('d'); self._spin_offsets = array('i', [0])
+        self._spin_out_x = array('d'); self._spin_out_y = array('d')
+        self._checkpoint_grid = {} # cell -> (xs, ys, checkpoints): flat float coords beside the Vec2ds. Rebuilt with the checkpoint index
+        self._checkpoint_near = None # cell -> (xs, ys, checkpoints) merged over its 3x3 neighbourhood, rebuilt lazily after checkpoint changes
         self.last_checkpoint_activated = None # Store the Vec2d world coordinate
 
-        # Camera
+        # Camera (clamp bounds are fixed for the screen size; 0 when the map is no larger than the screen)
+        self._cam_max_x = max(0, MAP_WIDTH - screen_width); self._cam_max_y = max(0, MAP_HEIGHT - screen_height)
         self.camera_offset = Vec2d(0, 0); self.reset_camera()
 
         # Boundaries
@@ -67,6 +114,13 @@ class GameWorld:
 
         # Fonts
         self.marker_font = pygame.font.SysFont(None, 24); self.checkpoint_font = pygame.font.SysFont(None, 20)
+        # Marker letters never change, render them once instead of every frame
+        self._s_glyph = self.marker_font.render('S', True, (0,0,0)).convert_alpha(); self._e_glyph = self.marker_font.render('E', True, (255,255,255)).convert_alpha()
+        self._c_glyph = self.checkpoint_font.render('C', True, (0,0,0)).convert_alpha()
+        # Checkpoint disc + outline + 'C' baked once per state, drawn as a single blit each
+        self._cp_surface_inactive = self._make_checkpoint_surface(CHECKPOINT_COLOR); self._cp_surface_active = self._make_checkpoint_surface(CHECKPOINT_ACTIVE_COLOR)
+
+        self._heart_strip = None # Row of max-health hearts, built on first HUD draw
 
         # Game state flags
         self.player_needs_respawn = False
@@ -74,6 +128,14 @@ class GameWorld:
         # --- Load Parallax Backgrounds ---
         self.parallax_layers = self._load_parallax_layers(PARALLAX_LAYERS_INFO)
 
+    def _make_checkpoint_surface(self, color):
+        """ Pre-renders one checkpoint icon. Only RGB is used, matching the old direct draws onto the (alpha-less) screen. """
+        size = 2 * CHECKPOINT_RADIUS + 4; center = (size // 2, size // 2)
+        surf = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(surf, color[:3], center, CHECKPOINT_RADIUS); pygame.draw.circle(surf, (50,50,50), center, CHECKPOINT_RADIUS, 2)
+        surf.blit(self._c_glyph, self._c_glyph.get_rect(center=center))
+        return surf.convert_alpha()
+
     def _load_parallax_layers(self, layer_infos):
         """Loads and scales parallax background images."""
         loaded_layers = []
@@ -83,10 +145,10 @@ class GameWorld:
         for info in layer_infos:
             try:
                 filepath = os.path.join(project_root, info["file"])
-                print(f"Loading parallax layer: {filepath}")
+                log.debug("Loading parallax layer: %s", filepath)
                 if not os.path.exists(filepath):
                     alt_filepath = os.path.join(os.path.dirname(script_dir), info["file"])
-                    print(f"File not found, trying alternative: {alt_filepath}")
+                    log.debug("File not found, trying alternative: %s", alt_filepath)
                     if not os.path.exists(alt_filepath): raise FileNotFoundError(f"Cannot find parallax layer: {info['file']}")
                     else: filepath = alt_filepath
                 img = pygame.image.load(filepath).convert_alpha()
@@ -94,24 +156,44 @@ class GameWorld:
                 if scale != 1.0:
                     new_size = (int(img.get_width() * scale), int(img.get_height() * scale))
                     img = pygame.transform.scale(img, new_size)
-                loaded_layers.append({ "image": img, "factor": info["factor"], "width": img.get_width(), "height": img.get_height() })
-                print(f"Loaded layer '{info['file']}' scaled to {img.get_size()}")
-            except Exception as e: print(f"Error loading parallax layer '{info['file']}': {e}")
+                # Fully opaque layers drop per-pixel alpha so their blits take SDL's plain copy path
+                is_opaque = pygame.mask.from_surface(img, 254).count() == img.get_width() * img.get_height()
+                if is_opaque: img = img.convert(); img.set_alpha(None)
+                # Pre-tile the image once across screen width + one tile, so drawing the layer is a single blit at any scroll
+                composite_size = (img.get_width() + self.screen_width, img.get_height())
+                composite = pygame.Surface(composite_size).convert() if is_opaque else pygame.Surface(composite_size, pygame.SRCALPHA).convert_alpha()
+                for tile_x in range(0, composite_size[0], img.get_width()): composite.blit(img, (tile_x, 0))
+                loaded_layers.append({ "image": img, "composite": composite, "factor": info["factor"], "width": img.get_width(), "height": img.get_height() })
+                log.debug("Loaded layer '%s' scaled to %s", info['file'], img.get_size())
+            except Exception as e: log.error("Error loading parallax layer '%s': %s", info['file'], e)
         return loaded_layers
 
     def set_gravity(self, gravity_vec): self.space.gravity = gravity_vec
-    def step_physics(self, dt): step_dt = 1.0 / 60.0; self.space.step(step_dt)
+    def step_physics(self, dt):
+        """
+        Advances the space by dt using fixed PHYSICS_DT substeps; leftover time carries over to the next frame.
+        The player's per-frame forces (run acceleration, held-jump counter-gravity) are re-applied on every substep,
+        since Pymunk clears body forces after each step. On a frame with no substep they are dropped rather than piling up;
+        its carried-over time is then simulated under the next frame's forces, so total impulse tracks real time.
+        """
+        self._phys_accum += dt
+        body = self.player.body if self.player else None
+        if body is not None: force = body.force; torque = body.torque; body.force = (0, 0); body.torque = 0.0 # Re-applied per substep below
+        while self._phys_accum >= PHYSICS_DT:
+            if body is not None: body.force = force; body.torque = torque
+            self.space.step(PHYSICS_DT); self._phys_accum -= PHYSICS_DT
+        self._refresh_moving_bbs()
 
     def add_player(self, position):
         if self.player: self.player.remove_from_space(self.space)
         self.player = Player(position, self.space, COLLISION_TYPES['player'], COLLISION_TYPES)
-        print("Player added to GameWorld")
+        log.debug("Player added to GameWorld")
 
     def ensure_player_in_space(self):
         if self.player: self.player.add_to_space(self.space)
 
     def remove_player(self):
-        if self.player: self.player.remove_from_space(self.space); self.player = None; print("Player removed from GameWorld")
+        if self.player: self.player.remove_from_space(self.space); self.player = None; log.debug("Player removed from GameWorld")
 
     def add_shape(self, shape_data):
         shape_type=shape_data.get('type'); pos_list=shape_data.get('position'); angle=shape_data.get('angle',0.0); properties=shape_data.get('properties',{}); size_list=shape_data.get('size'); radius=shape_data.get('radius'); vertices=shape_data.get('vertices')
@@ -120,57 +202,172 @@ class GameWorld:
         if size_list: new_shape.size = Vec2d(*size_list)
         if radius is not None: new_shape.radius = radius
         if vertices: new_shape.vertices = [tuple(v) for v in vertices]
-        if new_shape.body: self.shapes.append(new_shape); return new_shape
-        else: print(f"Warning: Failed to create/add shape: {shape_data}"); return None
+        if new_shape.body: self.shapes.append(new_shape); self._shape_ids[id(new_shape)] = new_shape; self._shape_grid_dirty = True; return new_shape
+        else: log.warning("Failed to create/add shape: %s", shape_data); return None
+
+    def has_shape(self, shape_instance): return id(shape_instance) in self._shape_ids
 
     def remove_shape(self, shape_instance):
-        if shape_instance in self.shapes: shape_instance.remove_from_space(self.space); self.shapes.remove(shape_instance); print("Shape removed")
+        if id(shape_instance) in self._shape_ids: shape_instance.remove_from_space(self.space); self.shapes.remove(shape_instance); self._shape_ids.pop(id(shape_instance), None); self._shape_grid_dirty = True; log.debug("Shape removed")
+
+    def reindex_shape(self, shape_instance):
+        """ Call after moving a shape's body: refreshes Pymunk's spatial index and the culling grid. """
+        if shape_instance.body: self.space.reindex_shapes_for_body(shape_instance.body)
+        self._shape_grid_dirty = True
+
+    def mark_shapes_moved(self):
+        """ Call after a shape was moved, resized or had its body recreated (grid is rebuilt on next use). """
+        self._shape_grid_dirty = True
+
+    def _rebuild_shape_grid(self):
+        """
+        Collects drawable shapes (in draw order) with their bounding boxes in flat left/bottom/right/top arrays,
+        and buckets static ones by the grid cells their box covers. Non-static (spinning) shapes are checked every frame.
+        """
+        grid_shapes = []; grid = {}; moving = []
+        bb_left = array('d'); bb_bottom = array('d'); bb_right = array('d'); bb_top = array('d')
+        for shape_obj in self.shapes:
+            if not shape_obj.shape or not shape_obj.body: continue
+            i = len(grid_shapes); grid_shapes.append(shape_obj)
+            bb = shape_obj.shape.bb; bb_left.append(bb.left); bb_bottom.append(bb.bottom); bb_right.append(bb.right); bb_top.append(bb.top)
+            if shape_obj.body.body_type != pymunk.Body.STATIC: moving.append(i); continue
+            x0, y0 = _grid_cell(bb.left, bb.bottom); x1, y1 = _grid_cell(bb.right, bb.top)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1): grid.setdefault((cx, cy), []).append(i)
+        self._grid_shapes = grid_shapes; self._shape_grid = grid; self._moving_shapes = moving
+        self._bb_left = bb_left; self._bb_bottom = bb_bottom; self._bb_right = bb_right; self._bb_top = bb_top
+        # Local vertices only change when a shape's physics objects are recreated, which marks the grid dirty
+        spin_polys = []; local_x = array('d'); local_y = array('d'); offsets = array('i', [0])
+        for i in moving:
+            shape_obj = grid_shapes[i]
+            if not isinstance(shape_obj.shape, pymunk.Poly): continue
+            for vx, vy in shape_obj.shape.get_vertices(): local_x.append(vx); local_y.append(vy)
+            offsets.append(len(local_x)); spin_polys.append(shape_obj)
+        self._spin_polys = spin_polys; self._spin_local_x = local_x; self._spin_local_y = local_y; self._spin_offsets = offsets
+        self._spin_out_x = array('d', bytes(8 * len(local_x))); self._spin_out_y = array('d', bytes(8 * len(local_y)))
+        self._shape_grid_dirty = False
+
+    def _transform_spinning_polys(self):
+        """ World vertices of every spinning polygon in one transform_polys pass, handed to each Shape's vertex cache. """
+        spin_polys = self._spin_polys
+        pos_x = array('d'); pos_y = array('d'); angles = array('d')
+        for shape_obj in spin_polys: body = shape_obj.body; pos_x.append(body.position.x); pos_y.append(body.position.y); angles.append(body.angle)
+        out_x = self._spin_out_x; out_y = self._spin_out_y; offsets = self._spin_offsets
+        transform_polys(self._spin_local_x, self._spin_local_y, offsets, pos_x, pos_y, angles, out_x, out_y)
+        for k, shape_obj in enumerate(spin_polys):
+            start = offsets[k]; end = offsets[k + 1]
+            shape_obj.set_world_vertices(list(zip(out_x[start:end], out_y[start:end])))
+
+    def _refresh_moving_bbs(self):
+        """ Copies the current bounding boxes of non-static shapes into the flat arrays (after a physics step). """
+        if self._shape_grid_dirty: return # Rebuild will read fresh boxes anyway
+        grid_shapes = self._grid_shapes; bb_left = self._bb_left; bb_bottom = self._bb_bottom; bb_right = self._bb_right; bb_top = self._bb_top
+        for i in self._moving_shapes:
+            bb = grid_shapes[i].shape.bb; bb_left[i] = bb.left; bb_bottom[i] = bb.bottom; bb_right[i] = bb.right; bb_top[i] = bb.top
+
+    def _shapes_in_view(self):
+        """ Shapes whose bounding box overlaps the camera view, in original draw order. Candidates come from the grid cells touching the view plus moving shapes. """
+        if self._shape_grid_dirty: self._rebuild_shape_grid()
+        view_l = self.camera_offset.x; view_t = self.camera_offset.y; view_r = view_l + self.screen_width; view_b = view_t + self.screen_height
+        x0, y0 = _grid_cell(view_l, view_t); x1, y1 = _grid_cell(view_r, view_b)
+        candidates = set(self._moving_shapes); grid = self._shape_grid
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1): candidates.update(grid.get((cx, cy), ()))
+        # Overlap test on the flat bb arrays (bottom is min y, top is max y in pymunk), no BB objects touched
+        bb_left = self._bb_left; bb_bottom = self._bb_bottom; bb_right = self._bb_right; bb_top = self._bb_top; grid_shapes = self._grid_shapes
+        return [grid_shapes[i] for i in sorted(candidates) if bb_right[i] >= view_l and bb_left[i] <= view_r and bb_top[i] >= view_t and bb_bottom[i] <= view_b]
+
+    def shape_at(self, x, y):
+        """ Topmost (last drawn) shape containing world point (x, y), or None. Grid cell + flat bb arrays prune candidates before the exact point_query. """
+        if self._shape_grid_dirty: self._rebuild_shape_grid()
+        # Grid cell lists are built in draw order, so without moving shapes they are used as-is (no set / sort per click)
+        candidates = self._shape_grid.get(_grid_cell(x, y), ())
+        if self._moving_shapes: candidates = sorted(set(candidates).union(self._moving_shapes))
+        bb_left = self._bb_left; bb_bottom = self._bb_bottom; bb_right = self._bb_right; bb_top = self._bb_top; grid_shapes = self._grid_shapes
+        for k in range(len(candidates) - 1, -1, -1): # Walk indices from the top of the draw order down
+            i = candidates[k]
+            if bb_left[i] <= x <= bb_right[i] and bb_bottom[i] <= y <= bb_top[i] and grid_shapes[i].shape.point_query((x, y)).distance <= 0: return grid_shapes[i]
+        return None
 
     def set_start_marker(self, position): self.start_marker = position
     def set_end_marker(self, position): self.end_marker = position
-    def add_checkpoint(self, position):
-        # Add print here for debugging placement
-        print(f"GameWorld: Adding checkpoint at world pos: {position}")
-        self.checkpoints.append(position)
-        print(f"GameWorld: Checkpoints list size now: {len(self.checkpoints)}")
+    def add_checkpoint(self, position, index=None):
+        log.debug("GameWorld: Adding checkpoint at world pos: %s", position)
+        if index is None: self.checkpoints.append(position)
+        else: self.checkpoints.insert(max(0, min(index, len(self.checkpoints))), position)
+        self._checkpoint_index[(position.x, position.y)] = position
+        self._grid_add_checkpoint(position)
+        log.debug("GameWorld: Checkpoints list size now: %s", len(self.checkpoints))
+
+    def find_checkpoint(self, position):
+        """ Returns the stored checkpoint equal to position, or None (dict lookup, no list scan). """
+        return self._checkpoint_index.get((position.x, position.y))
+
+    def remove_checkpoint(self, position):
+        """ Removes the checkpoint equal to position. Returns its (index, value), or (-1, None) if not found. """
+        cp = self.find_checkpoint(position)
+        if cp is None: return -1, None
+        index = self.checkpoints.index(cp); self.checkpoints.pop(index)
+        if cp not in self.checkpoints: del self._checkpoint_index[(cp.x, cp.y)] # Keep the key while a duplicate at the same spot remains
+        xs, ys, cell_cps = self._checkpoint_grid[_grid_cell(cp.x, cp.y)]
+        i = cell_cps.index(cp); del xs[i]; del ys[i]; del cell_cps[i]; self._checkpoint_near = None
+        if self.last_checkpoint_activated == cp: self.last_checkpoint_activated = None
+        return index, cp
+
+    def _rebuild_checkpoint_index(self):
+        self._checkpoint_index = {(cp.x, cp.y): cp for cp in self.checkpoints}
+        self._checkpoint_grid = {}
+        for cp in self.checkpoints: self._grid_add_checkpoint(cp)
+
+    def _grid_add_checkpoint(self, cp):
+        xs, ys, cell_cps = self._checkpoint_grid.setdefault(_grid_cell(cp.x, cp.y), (array('d'), array('d'), []))
+        xs.append(cp.x); ys.append(cp.y); cell_cps.append(cp); self._checkpoint_near = None
+
+    def _build_checkpoint_neighbourhoods(self):
+        """ Precomputes, for every cell around a checkpoint, the checkpoints of its 3x3 block, so activation is one lookup and one scan. """
+        near = {}
+        for (cx, cy), (xs, ys, cell_cps) in self._checkpoint_grid.items():
+            for nx in (cx - 1, cx, cx + 1):
+                for ny in (cy - 1, cy, cy + 1):
+                    near_xs, near_ys, near_cps = near.setdefault((nx, ny), (array('d'), array('d'), []))
+                    near_xs.extend(xs); near_ys.extend(ys); near_cps.extend(cell_cps)
+        self._checkpoint_near = near
 
     def clear_level(self):
         self.remove_player();
         for shape in list(self.shapes): self.remove_shape(shape)
         self.shapes.clear(); self.start_marker = None; self.end_marker = None
-        self.checkpoints = []; self.last_checkpoint_activated = None
-        self.reset_camera(); print("GameWorld cleared")
+        self.checkpoints = []; self._checkpoint_index = {}; self._checkpoint_grid = {}; self._checkpoint_near = None; self.last_checkpoint_activated = None
+        self.reset_camera(); log.debug("GameWorld cleared")
 
     def get_spawn_position(self):
         spawn_pos_world = self.last_checkpoint_activated or self.start_marker
-        if not spawn_pos_world: spawn_pos_world = Vec2d(MAP_WIDTH / 2, MAP_HEIGHT / 2); print("Warning: No start/checkpoint found, using fallback spawn.")
+        if not spawn_pos_world: spawn_pos_world = Vec2d(MAP_WIDTH / 2, MAP_HEIGHT / 2); log.warning("No start/checkpoint found, using fallback spawn.")
         safe_x = max(PLAYER_RADIUS + BOUNDARY_THICKNESS, min(spawn_pos_world.x, MAP_WIDTH - PLAYER_RADIUS - BOUNDARY_THICKNESS))
         safe_y = max(PLAYER_RADIUS + BOUNDARY_THICKNESS, min(spawn_pos_world.y, MAP_HEIGHT - PLAYER_RADIUS - BOUNDARY_THICKNESS))
         return Vec2d(safe_x, safe_y)
 
     def update_player_state(self, dt, keys):
-        if self.player: self.player.handle_input(keys, dt); self.player.update(dt, self.space)
+        if self.player: now = time.perf_counter(); self.player.handle_input(keys, dt, now); self.player.update(dt, self.space, now) # One clock read per frame
 
     # --- MODIFIED Checkpoint Update Logic ---
     def update_checkpoints(self):
         """Checks for player activating checkpoints."""
         if not self.player or not self.checkpoints: return
 
-        player_pos_world = self.player.body.position
+        px, py = self.player.body.position
         activation_radius_sq = (PLAYER_RADIUS + CHECKPOINT_RADIUS) ** 2
 
         closest_activated_checkpoint = None
-        min_dist_sq = float('inf')
-
-        # Find the *closest* checkpoint the player is currently touching
-        for cp_pos_world in self.checkpoints:
-            delta_vec = player_pos_world - cp_pos_world
-            distance_sq = delta_vec.dot(delta_vec)
 
-            if distance_sq < activation_radius_sq:
-                if distance_sq < min_dist_sq:
-                    min_dist_sq = distance_sq
-                    closest_activated_checkpoint = cp_pos_world
+        # Find the *closest* checkpoint the player is currently touching (only the 3x3 cells around the player)
+        # The nearest-point search runs on the flat coordinate arrays (JIT-compiled when Numba is available)
+        if self._checkpoint_near is None: self._build_checkpoint_neighbourhoods()
+        near = self._checkpoint_near.get(_grid_cell(px, py))
+        if near:
+            xs, ys, near_cps = near
+            i = nearest_within(xs, ys, px, py, activation_radius_sq) # Only checkpoints the player is touching can win
+            if i >= 0: closest_activated_checkpoint = near_cps[i]
 
         # Now update last_checkpoint_activated only if the closest one found
         # is different from the currently stored one.
@@ -180,7 +377,7 @@ class GameWorld:
             activated_tuple = closest_activated_checkpoint.int_tuple
 
             if current_last_tuple != activated_tuple:
-                print(f"Checkpoint Activated: {closest_activated_checkpoint}") # Print the Vec2d
+                log.debug("Checkpoint Activated: %s", closest_activated_checkpoint)
                 self.last_checkpoint_activated = closest_activated_checkpoint # Store the Vec2d
 
     def check_win_condition(self):
@@ -207,9 +404,9 @@ class GameWorld:
 
     # Respawn Logic
     def respawn_player(self):
-        if not self.player: print("Error: Cannot respawn, player object missing."); return
+        if not self.player: log.error("Cannot respawn, player object missing."); return
         spawn_pos_world = self.last_checkpoint_activated or self.start_marker
-        if not spawn_pos_world: spawn_pos_world = Vec2d(MAP_WIDTH / 2, MAP_HEIGHT / 2); print(f"Warning: No start/checkpoint, respawning at fallback: {spawn_pos_world}")
+        if not spawn_pos_world: spawn_pos_world = Vec2d(MAP_WIDTH / 2, MAP_HEIGHT / 2); log.warning("No start/checkpoint, respawning at fallback: %s", spawn_pos_world)
         safe_x = max(PLAYER_RADIUS + BOUNDARY_THICKNESS, min(spawn_pos_world.x, MAP_WIDTH - PLAYER_RADIUS - BOUNDARY_THICKNESS))
         safe_y = max(PLAYER_RADIUS + BOUNDARY_THICKNESS, min(spawn_pos_world.y, MAP_HEIGHT - PLAYER_RADIUS - BOUNDARY_THICKNESS))
         safe_spawn_pos_world = Vec2d(safe_x, safe_y)
@@ -219,69 +416,71 @@ class GameWorld:
     # Camera
     def update_camera(self, force_center=False):
         if not self.player: return
-        player_pos = self.player.body.position; screen_w = self.screen_width; screen_h = self.screen_height
-        target_x = player_pos.x - screen_w / 2; target_y = player_pos.y - screen_h / 2
-        clamped_x = max(0, min(target_x, MAP_WIDTH - screen_w)) if MAP_WIDTH > screen_w else 0
-        clamped_y = max(0, min(target_y, MAP_HEIGHT - screen_h)) if MAP_HEIGHT > screen_h else 0
+        player_pos = self.player.body.position
+        target_x = player_pos.x - self.screen_width / 2; target_y = player_pos.y - self.screen_height / 2
+        clamped_x = max(0.0, min(target_x, self._cam_max_x)); clamped_y = max(0.0, min(target_y, self._cam_max_y))
         new_offset = Vec2d(clamped_x, clamped_y)
         if force_center: self.camera_offset = new_offset
         else: self.camera_offset = self.camera_offset.interpolate_to(new_offset, 0.08)
 
     def reset_camera(self):
-        cam_x = max(0, (MAP_WIDTH - self.screen_width) / 2) if MAP_WIDTH > self.screen_width else 0
-        cam_y = max(0, (MAP_HEIGHT - self.screen_height) / 2) if MAP_HEIGHT > self.screen_height else 0
-        cam_x = min(cam_x, MAP_WIDTH - self.screen_width) if MAP_WIDTH > self.screen_width else 0
-        cam_y = min(cam_y, MAP_HEIGHT - self.screen_height) if MAP_HEIGHT > self.screen_height else 0
-        self.camera_offset = Vec2d(cam_x, cam_y)
+        self.camera_offset = Vec2d(self._cam_max_x / 2, self._cam_max_y / 2) # Centered on the map
 
     # --- Drawing ---
-    def _world_to_screen(self, world_pos): return world_pos - self.camera_offset
+    def _world_to_screen_xy(self, x, y): cam = self.camera_offset; return (int(x - cam.x), int(y - cam.y)) # Scalar form for callers that already hold x / y
     def _screen_to_world(self, screen_pos): return Vec2d(screen_pos[0], screen_pos[1]) + self.camera_offset
 
     def draw(self, screen):
         """Draws parallax background, then world elements."""
-        # 1. Draw Parallax Background Layers
+        # Hoist per-frame constants and bound methods into locals for the loops below
+        sw = self.screen_width; sh = self.screen_height; cam = self.camera_offset; cam_x = cam.x; cam_y = cam.y
+        blit = screen.blit; circle = pygame.draw.circle
+
+        # 1. Draw Parallax Background Layers (one pre-tiled composite per layer, all in one batched blits call, back to front)
+        parallax_blits = []
         for layer in self.parallax_layers:
-            image = layer["image"]; factor = layer["factor"]; img_width = layer["width"]; img_height = layer["height"]
-            layer_offset_x = self.camera_offset.x * factor; start_x = -(layer_offset_x % img_width)
-            tiles_needed = math.ceil(self.screen_width / img_width) + 1; draw_y = 0 # Top aligned
-            for i in range(tiles_needed):
-                blit_pos_x = start_x + (i * img_width)
-                if blit_pos_x < self.screen_width and blit_pos_x + img_width > 0: screen.blit(image, (int(blit_pos_x), int(draw_y)))
+            start_x = -(int(cam_x * layer["factor"]) % layer["width"]) # Integer wrap, always in (-img_width, 0]
+            parallax_blits.append((layer["composite"], (start_x, 0))) # Top aligned
+        if parallax_blits: screen.blits(parallax_blits, doreturn=False)
 
         # 2. Draw Boundaries
-        for segment in self._boundary_segments: p1_s=self._world_to_screen(segment.a); p2_s=self._world_to_screen(segment.b); pygame.draw.line(screen, BOUNDARY_COLOR, p1_s, p2_s, max(1, int(BOUNDARY_THICKNESS)))
+        pygame.draw.lines(screen, BOUNDARY_COLOR, True, [(x - cam_x, y - cam_y) for x, y in self._boundary_corners], BOUNDARY_DRAW_WIDTH) # Closed outline, one call
 
         # 3. Draw Shapes
-        visible_world_rect = pygame.Rect(self.camera_offset.x, self.camera_offset.y, self.screen_width, self.screen_height)
-        for shape_obj in self.shapes:
-             if shape_obj.shape and hasattr(shape_obj.shape, 'bb'):
-                 shape_bb = shape_obj.shape.bb; shape_world_rect = pygame.Rect(shape_bb.left, shape_bb.top, shape_bb.right - shape_bb.left, shape_bb.bottom - shape_bb.top)
-                 if shape_world_rect.colliderect(visible_world_rect): shape_obj.draw(screen, self.camera_offset)
+        visible_shapes = self._shapes_in_view()
+        if self._spin_polys: self._transform_spinning_polys()
+        for shape_obj in visible_shapes: shape_obj.draw(screen, cam) # Already culled against the view
 
         # 4. Draw Markers (Start, End, Checkpoints)
-        if self.start_marker: pos_s=self._world_to_screen(self.start_marker);
-        if 0<=pos_s.x<=self.screen_width and 0<=pos_s.y<=self.screen_height: pygame.draw.circle(screen, (0, 255, 0, 180), pos_s, 12); text=self.marker_font.render('S', True, (0,0,0)); r=text.get_rect(center=pos_s); screen.blit(text, r)
-        if self.end_marker: pos_s=self._world_to_screen(self.end_marker);
-        if 0<=pos_s.x<=self.screen_width and 0<=pos_s.y<=self.screen_height: pygame.draw.circle(screen, (255, 0, 0, 180), pos_s, 12); text=self.marker_font.render('E', True, (255,255,255)); r=text.get_rect(center=pos_s); screen.blit(text, r)
-        # --- Add print inside checkpoint draw loop for debugging visibility ---
+        if self.start_marker is not None:
+            sx = self.start_marker.x - cam_x; sy = self.start_marker.y - cam_y
+            if 0 <= sx <= sw and 0 <= sy <= sh: pos_s = (sx, sy); circle(screen, (0, 255, 0, 180), pos_s, 12); blit(self._s_glyph, self._s_glyph.get_rect(center=pos_s))
+        if self.end_marker is not None:
+            sx = self.end_marker.x - cam_x; sy = self.end_marker.y - cam_y
+            if 0 <= sx <= sw and 0 <= sy <= sh: pos_s = (sx, sy); circle(screen, (255, 0, 0, 180), pos_s, 12); blit(self._e_glyph, self._e_glyph.get_rect(center=pos_s))
+        cp_half = CHECKPOINT_RADIUS + 2 # Icon surfaces are centered on the checkpoint
+        last_cp = self.last_checkpoint_activated; cp_active = self._cp_surface_active; cp_inactive = self._cp_surface_inactive
         for cp_pos_world in self.checkpoints:
-            pos_s = self._world_to_screen(cp_pos_world)
-            # print(f"Draw loop: CP World={cp_pos_world}, Screen={pos_s}") # DEBUG PRINT
-            if 0 <= pos_s.x <= self.screen_width and 0 <= pos_s.y <= self.screen_height:
-                is_active = (self.last_checkpoint_activated == cp_pos_world) # Compare Vec2d should be ok now
-                color = CHECKPOINT_ACTIVE_COLOR if is_active else CHECKPOINT_COLOR
-                pygame.draw.circle(screen, color, pos_s, CHECKPOINT_RADIUS)
-                pygame.draw.circle(screen, (50,50,50), pos_s, CHECKPOINT_RADIUS, 2)
-                text = self.checkpoint_font.render('C', True, (0,0,0)); r=text.get_rect(center=pos_s); screen.blit(text, r)
+            sx = cp_pos_world.x - cam_x; sy = cp_pos_world.y - cam_y
+            if 0 <= sx <= sw and 0 <= sy <= sh:
+                blit(cp_active if last_cp == cp_pos_world else cp_inactive, (int(sx) - cp_half, int(sy) - cp_half))
 
         # 5. Draw Player
-        if self.player: self.player.draw(screen, self.camera_offset, self.screen_width, self.screen_height)
+        if self.player: self.player.draw(screen, cam, sw, sh)
 
 
     def draw_hud(self, screen):
-        if self.player and HEART_IMG: heart_x=15; heart_y=TOOLBAR_HEIGHT+15;
-        for i in range(self.player.health): screen.blit(HEART_IMG, (heart_x + i * (HEART_IMG.get_width() + 5), heart_y))
+        if not self.player or not HEART_IMG or self.player.health <= 0: return
+        heart_step = HEART_IMG.get_width() + HEART_SPACING
+        strip = self._heart_strip
+        if strip is None or strip.get_width() < self.player.max_health * heart_step: strip = self._heart_strip = self._build_heart_strip(self.player.max_health, heart_step)
+        # One blit of the strip's first `health` hearts
+        screen.blit(strip, (15, TOOLBAR_HEIGHT + 15), area=pygame.Rect(0, 0, self.player.health * heart_step, strip.get_height()))
+
+    def _build_heart_strip(self, count, heart_step):
+        strip = pygame.Surface((max(1, count) * heart_step, HEART_IMG.get_height()), pygame.SRCALPHA)
+        for i in range(count): strip.blit(HEART_IMG, (i * heart_step, 0))
+        return strip.convert_alpha()
 
 
     # Boundaries
@@ -289,7 +488,7 @@ class GameWorld:
         for seg in self._boundary_segments:
             if seg in self.space.shapes: self.space.remove(seg)
         self._boundary_segments.clear(); static_body = self.space.static_body
-        points = [(0, 0), (MAP_WIDTH, 0), (MAP_WIDTH, MAP_HEIGHT), (0, MAP_HEIGHT)]
+        points = [(0, 0), (MAP_WIDTH, 0), (MAP_WIDTH, MAP_HEIGHT), (0, MAP_HEIGHT)]; self._boundary_corners = points # Kept for drawing the outline in one call
         for i in range(4):
             p1 = points[i]; p2 = points[(i + 1) % 4]
             segment = pymunk.Segment(static_body, p1, p2, BOUNDARY_THICKNESS / 2)
@@ -299,31 +498,31 @@ class GameWorld:
 
     # Save / Load
     def save_level_data(self, filename="level.json"):
-        print(f"Saving level data to {filename}...")
+        log.info("Saving level data to %s...", filename)
         level_data = {'start_marker': self.start_marker.int_tuple if self.start_marker else None,'end_marker': self.end_marker.int_tuple if self.end_marker else None,'checkpoints': [cp.int_tuple for cp in self.checkpoints],'shapes': [] }
         for shape_obj in self.shapes:
             if not shape_obj.body: continue
             shape_info={'type':shape_obj.shape_type,'position':shape_obj.body.position.int_tuple,'angle':shape_obj.body.angle,'properties':shape_obj.properties.copy(),'size':shape_obj.size.int_tuple if shape_obj.size else None,'radius':shape_obj.radius if shape_obj.radius is not None else None,'vertices':shape_obj.vertices if shape_obj.vertices else None}
             level_data['shapes'].append(shape_info)
         try:
-            with open(filename, 'w') as f: json.dump(level_data, f, indent=4); print(f"Level data saved successfully.")
-        except Exception as e: print(f"Error saving level data: {e}")
+            with open(filename, 'wb') as f: f.write(_json_dumps(level_data)); log.info("Level data saved successfully.")
+        except Exception as e: log.error("Error saving level data: %s", e)
 
     def load_level_data(self, filename="level.json"):
-        if not os.path.exists(filename): print(f"Error: Save file '{filename}' not found."); return False
-        print(f"Loading level data from {filename}...")
+        if not os.path.exists(filename): log.error("Save file '%s' not found.", filename); return False
+        log.info("Loading level data from %s...", filename)
         self.clear_level()
         try:
-            with open(filename, 'r') as f: level_data = json.load(f)
+            with open(filename, 'rb') as f: level_data = _json_loads(f.read())
             if level_data.get('start_marker'): self.start_marker = Vec2d(*level_data['start_marker'])
             if level_data.get('end_marker'): self.end_marker = Vec2d(*level_data['end_marker'])
             loaded_checkpoints = level_data.get('checkpoints', [])
-            self.checkpoints = [Vec2d(*cp_tuple) for cp_tuple in loaded_checkpoints]
-            print(f"Loaded {len(self.checkpoints)} checkpoints: {self.checkpoints}") # DEBUG PRINT
+            self.checkpoints = [Vec2d(*cp_tuple) for cp_tuple in loaded_checkpoints]; self._rebuild_checkpoint_index()
+            log.debug("Loaded %s checkpoints: %s", len(self.checkpoints), self.checkpoints)
             loaded_shapes_data = level_data.get('shapes', [])
             count = 0
             for shape_data in loaded_shapes_data:
                 if self.add_shape(shape_data): count += 1
-            print(f"Level loaded successfully. {count} shapes, {len(self.checkpoints)} checkpoints loaded.")
+            log.info("Level loaded successfully. %s shapes, %s checkpoints loaded.", count, len(self.checkpoints))
             return True
-        except Exception as e: print(f"An unexpected error occurred during loading: {e}"); import traceback; traceback.print_exc(); self.clear_level(); return False
\ No newline at end of file
+        except Exception as e: log.exception("An unexpected error occurred during loading: %s", e); self.clear_level(); return False
\ No newline at end of file
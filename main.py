@@ -1,4 +1,5 @@
 # main.py
+import logging
 import pygame
 import sys
 
@@ -9,6 +10,8 @@ from states.playing_state import PlayingState
 # --- Import Player class to call load_assets ---
 from player import Player
 
+# Save/load results and warnings reach the console; per-action debug traces stay off (use level=logging.DEBUG to see them)
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 pygame.init() # Initialize Pygame modules
 pygame.font.init()
 
@@ -51,8 +54,9 @@ class GameStateManager:
             self.active_state.update(dt)
 
     def draw(self, screen):
+        """ Passes through the active state's draw result: False (skipped), a list of dirty rects, or anything else for a full flip. """
         if self.active_state:
-            self.active_state.draw(screen)
+            return self.active_state.draw(screen)
 
 
 # --- Main Execution ---
@@ -86,10 +90,11 @@ if __name__ == '__main__': # Good practice
 
         # --- Drawing ---
         # Delegate drawing to the active state
-        game_manager.draw(screen)
+        drawn = game_manager.draw(screen)
 
-        # Flip the display
-        pygame.display.flip()
+        # Present the frame: nothing when unchanged, only the dirty rects when the state reported them, else a full flip
+        if isinstance(drawn, list): pygame.display.update(drawn)
+        elif drawn is not False: pygame.display.flip()
 
     # --- Shutdown ---
     pygame.quit()
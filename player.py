@@ -2,9 +2,13 @@
 import pygame
 import pymunk
 from pymunk import Vec2d
-import time
 import os
 
+from geom import njit, HAS_NUMBA
+
+# Key codes read every frame in handle_input, bound once at import
+_K_SPACE = pygame.K_SPACE; _K_LEFT = pygame.K_LEFT; _K_RIGHT = pygame.K_RIGHT
+
 # --- Constants ---
 # Physics
 PLAYER_RADIUS = 15
@@ -18,6 +22,8 @@ FRAME_WIDTH = 165; FRAME_HEIGHT = 165
 SPRITE_SHEET_COLS = 10; SPRITE_SHEET_ROWS = 20
 RUN_ANIM_FPS = 18; JUMP_ANIM_FPS = 16; IDLE_ANIM_FPS = 8; DEATH_ANIM_FPS = 25 # Faster death anim
 PLAYER_SPRITE_SCALE = 0.5
+ANIM_FPS = {"run": RUN_ANIM_FPS, "jump": JUMP_ANIM_FPS, "idle": IDLE_ANIM_FPS, "death": DEATH_ANIM_FPS}
+ANIM_TIME_PER_FRAME = {name: (1.0 / fps if fps > 0 else float('inf')) for name, fps in ANIM_FPS.items()} # Seconds per frame, pre-divided
 
 ANIMATIONS = {
     "run":      (26, 17),
@@ -36,13 +42,42 @@ AIR_CONTROL_FACTOR = 0.6
 STICKY_MOVE_FACTOR = 0.3; STICKY_JUMP_FACTOR = 0.5
 JUMP_IMPULSE = 600; ENABLE_VARIABLE_JUMP = True
 VARIABLE_JUMP_MULTIPLIER = 0.4; VARIABLE_JUMP_TIME = 0.3
+_JUMP_COUNTER_COEF = PLAYER_MASS * (1.0 - VARIABLE_JUMP_MULTIPLIER) # Held-jump counter-gravity per unit of gravity
 COYOTE_TIME_LIMIT = 0.1; JUMP_BUFFER_LIMIT = 0.1
 STUCK_VELOCITY_THRESHOLD = 5.0; STUCK_TIME_THRESHOLD = 0.2
 NUDGE_IMPULSE_STRENGTH = 100.0
 
 
 # --- Helper Function ---
-def load_sliced_sprites_grid(filename, frame_width, frame_height, cols, rows):
+def scale_frame(frame, scale):
+    """ Returns frame resized by scale (smoothscale, plain scale if the surface format can't be smoothscaled). """
+    if scale == 1.0: return frame
+    new_size = (int(frame.get_width() * scale), int(frame.get_height() * scale))
+    try: return pygame.transform.smoothscale(frame, new_size)
+    except ValueError: return pygame.transform.scale(frame, new_size)
+
+def tint_frame(frame):
+    """ Copy of frame with the red invincibility-flash tint added. """
+    tinted = frame.copy(); tinted.fill((255, 50, 50, 100), special_flags=pygame.BLEND_RGBA_ADD)
+    return tinted.convert_alpha()
+
+@njit(cache=True)
+def jump_frame_index(current_y, vel_y, jump_start_y, jump_peak_y, frame_count):
+    """ Jump animation frame from vertical progress: rising covers the first half of the frames, falling the second. Returns (new_peak_y, frame_idx). """
+    if vel_y < 0: # Moving up
+        jump_peak_y = min(jump_peak_y, current_y)
+        if jump_start_y > jump_peak_y: progress = min(max((jump_start_y - current_y) / (jump_start_y - jump_peak_y), 0.0), 1.0) * 0.5
+        else: progress = 0.0
+    else: # Moving down
+        if jump_start_y > jump_peak_y: progress = 0.5 + min(max((current_y - jump_peak_y) / (jump_start_y - jump_peak_y), 0.0), 1.0) * 0.5
+        else: progress = 1.0
+    progress = min(max(progress, 0.0), 1.0)
+    return jump_peak_y, int(progress * (frame_count - 1))
+
+if HAS_NUMBA: jump_frame_index(0.0, 0.0, 0.0, 0.0, 2) # Compile (or load from cache) at import instead of on the first jump
+
+def load_sliced_sprites_grid(filename, frame_width, frame_height, cols, rows, scale=1.0):
+    """ Slices the spritesheet into frames, each resized by scale as it is cut (so full-size frames are never kept). """
     try:
         script_dir = os.path.dirname(os.path.abspath(__file__))
         # Adjust path if needed, assuming player.py is at project root relative to assets
@@ -63,7 +98,7 @@ def load_sliced_sprites_grid(filename, frame_width, frame_height, cols, rows):
         for col_idx in range(cols):
             rect = pygame.Rect(col_idx * frame_width, row_idx * frame_height, frame_width, frame_height)
             frame = pygame.Surface((frame_width, frame_height), pygame.SRCALPHA); frame.blit(spritesheet, (0, 0), rect)
-            frames.append(frame)
+            frames.append(scale_frame(frame, scale).convert_alpha())
     if frames: print(f"Successfully loaded and converted {len(frames)} frames from {filename}")
     else: print(f"Warning: Loaded 0 frames from {filename}, dimensions might be wrong.")
     return frames
@@ -72,19 +107,35 @@ def load_sliced_sprites_grid(filename, frame_width, frame_height, cols, rows):
 class Player:
     SPRITE_FRAMES = None
     FALLBACK_FRAME = None
+    # Draw-ready frames: scaled by PLAYER_SPRITE_SCALE once at load, one list per facing direction
+    SPRITE_FRAMES_R = None
+    SPRITE_FRAMES_L = None
+    SCALED_FRAME_SIZES = None # (width, height) per frame, same for both facings
+    # Red-tinted copies of the above for the invincibility flash, built at load
+    SPRITE_FRAMES_R_TINT = None
+    SPRITE_FRAMES_L_TINT = None
 
     @classmethod
     def load_assets(cls):
         if cls.SPRITE_FRAMES is None:
             print("Loading player assets...")
-            cls.SPRITE_FRAMES = load_sliced_sprites_grid(SPRITESHEET_PATH, FRAME_WIDTH, FRAME_HEIGHT, SPRITE_SHEET_COLS, SPRITE_SHEET_ROWS)
+            cls.SPRITE_FRAMES = load_sliced_sprites_grid(SPRITESHEET_PATH, FRAME_WIDTH, FRAME_HEIGHT, SPRITE_SHEET_COLS, SPRITE_SHEET_ROWS, PLAYER_SPRITE_SCALE)
             if not cls.SPRITE_FRAMES:
                 print("Error: Failed to load player spritesheet! Using fallback.")
                 fallback_surf = pygame.Surface((30, 30), pygame.SRCALPHA); pygame.draw.circle(fallback_surf, (0, 200, 255), (15, 15), 15)
+                fallback_surf = scale_frame(fallback_surf, PLAYER_SPRITE_SCALE).convert_alpha() # Same size rules as sheet frames
                 cls.SPRITE_FRAMES = [fallback_surf]; cls.FALLBACK_FRAME = fallback_surf
                 global ANIMATIONS, DEFAULT_ANIMATION, NON_LOOPING_ANIMATIONS
                 ANIMATIONS = {"idle": (0, 1)}; DEFAULT_ANIMATION = "idle"; NON_LOOPING_ANIMATIONS = {}
-            else: cls.FALLBACK_FRAME = cls.SPRITE_FRAMES[0]
+            # Frame counts are trusted by draw/update from here on, repair bad entries once
+            for name, (start_frame, frame_count) in ANIMATIONS.items():
+                if frame_count <= 0: print(f"Warning: Animation '{name}' has {frame_count} frames, using 1."); ANIMATIONS[name] = (start_frame, 1)
+            # Frames arrive pre-scaled; flip them once up front so draw only picks a surface
+            cls.SPRITE_FRAMES_R = cls.SPRITE_FRAMES
+            cls.SPRITE_FRAMES_L = [pygame.transform.flip(frame, True, False) for frame in cls.SPRITE_FRAMES_R]
+            cls.SCALED_FRAME_SIZES = [frame.get_size() for frame in cls.SPRITE_FRAMES_R]
+            cls.SPRITE_FRAMES_R_TINT = [tint_frame(frame) for frame in cls.SPRITE_FRAMES_R]; cls.SPRITE_FRAMES_L_TINT = [tint_frame(frame) for frame in cls.SPRITE_FRAMES_L]
+            cls.FALLBACK_FRAME = cls.SPRITE_FRAMES_R[0]
 
     def __init__(self, position, space, collision_type_id, collision_types_dict):
         if Player.SPRITE_FRAMES is None: raise RuntimeError("Player assets not loaded!")
@@ -96,21 +147,21 @@ class Player:
         self.shape.game_object_ref = self; self.body.game_object_ref = self
         self.collision_types = collision_types_dict
         self.max_health = PLAYER_MAX_HEALTH; self.health = self.max_health
-        self.invincible_timer = 0.0; self.on_ground = False
+        self.invincible_timer = 0.0; self._flash_on = False; self.on_ground = False
         self.is_on_sticky_ground = False; self.last_on_ground_time = 0.0
         self.jump_requested_time = -1.0; self.is_holding_jump = False
         self.variable_jump_timer = 0.0; self.stuck_timer = 0.0; self._horizontal_intent = 0
-        self.current_animation_name = DEFAULT_ANIMATION; self.current_frame_index_in_sequence = 0
+        self.current_animation_name = DEFAULT_ANIMATION; self.current_frame_index_in_sequence = 0; self._cache_animation(DEFAULT_ANIMATION)
         self.animation_timer = 0.0; self.facing_right = True; self.animation_finished = False
         self.is_dead = False; self.jump_start_y = 0.0; self.jump_peak_y = 0.0; self.is_jumping_state = False
 
     def reset_state(self, position):
         self.body.position = position; self.body.velocity = Vec2d.zero(); self.body.angular_velocity = 0
-        self.health = self.max_health; self.invincible_timer = 0.0; self.on_ground = False
+        self.health = self.max_health; self.invincible_timer = 0.0; self._flash_on = False; self.on_ground = False
         self.is_on_sticky_ground = False; self.last_on_ground_time = 0.0
         self.jump_requested_time = -1.0; self.is_holding_jump = False; self.variable_jump_timer = 0.0
         self.stuck_timer = 0.0; self._horizontal_intent = 0
-        self.current_animation_name = DEFAULT_ANIMATION; self.current_frame_index_in_sequence = 0
+        self.current_animation_name = DEFAULT_ANIMATION; self.current_frame_index_in_sequence = 0; self._cache_animation(DEFAULT_ANIMATION)
         self.animation_timer = 0.0; self.facing_right = True; self.animation_finished = False
         self.is_dead = False; self.is_jumping_state = False
 
@@ -135,42 +186,43 @@ class Player:
         return False # Was invincible
 
     def _update_ground_contact(self, space):
-        # (Unchanged from previous working version)
-        ground_contact_info = {'found': False, 'is_sticky': False}
-        def check_arbiter_for_ground(arbiter):
-            if not hasattr(self, 'collision_types'): return
-            if ground_contact_info['found'] and not ground_contact_info['is_sticky']: return
-            contact_normal = arbiter.contact_point_set.normal; is_player_shape_a = arbiter.shapes[0] == self.shape
-            other_shape = arbiter.shapes[1] if is_player_shape_a else arbiter.shapes[0]
-            is_ground_contact = False
-            if is_player_shape_a and contact_normal.y > 0.7: is_ground_contact = True
-            elif not is_player_shape_a and contact_normal.y < -0.7: is_ground_contact = True
-            if is_ground_contact:
-                is_platform = other_shape.body.body_type in (pymunk.Body.STATIC, pymunk.Body.KINEMATIC)
-                try: is_danger_shape = other_shape.collision_type == self.collision_types['danger']
-                except KeyError: is_danger_shape = False
-                except AttributeError: is_danger_shape = False
-                if is_platform or is_danger_shape:
-                    ground_contact_info['found'] = True
-                    if hasattr(other_shape, 'game_object_ref') and other_shape.game_object_ref:
-                        if other_shape.game_object_ref.properties.get('Sticky', False): ground_contact_info['is_sticky'] = True
-        self.body.each_arbiter(check_arbiter_for_ground)
-        self.on_ground = ground_contact_info['found']; self.is_on_sticky_ground = ground_contact_info['is_sticky']
+        """ Sets on_ground / is_on_sticky_ground from the body's current contacts. """
+        # Arbiters are only valid inside the each_arbiter callback, so all checks run there and only bools come out
+        player_shape = self.shape; danger_type = self.collision_types.get('danger')
+        platform_types = (pymunk.Body.STATIC, pymunk.Body.KINEMATIC)
+        contact = [False, False] # found ground, ground is sticky
+
+        def check_arbiter(arbiter):
+            if contact[1]: return # Already on sticky ground: nothing left to learn from the remaining contacts
+            normal_y = arbiter.contact_point_set.normal.y; shape_a, shape_b = arbiter.shapes
+            if shape_a == player_shape:
+                if normal_y <= 0.7: return
+                other_shape = shape_b
+            else:
+                if normal_y >= -0.7: return
+                other_shape = shape_a
+            if other_shape.body.body_type in platform_types or other_shape.collision_type == danger_type:
+                contact[0] = True
+                game_object = getattr(other_shape, 'game_object_ref', None)
+                if game_object and game_object.properties.get('Sticky', False): contact[1] = True
+
+        self.body.each_arbiter(check_arbiter)
+        self.on_ground, self.is_on_sticky_ground = contact
 
     # --- MODIFIED handle_input ---
-    def handle_input(self, keys, dt):
+    def handle_input(self, keys, dt, now):
+        """ now: the frame's time.perf_counter() reading, shared with update(). """
         if self.is_dead: return # No input if dead
 
         # (Rest of input handling remains the same)
-        current_time = time.time(); self._horizontal_intent = 0
-        if keys[pygame.K_SPACE]:
+        current_time = now; self._horizontal_intent = 0
+        if keys[_K_SPACE]:
             if self.jump_requested_time < 0 and not self.is_holding_jump: self.jump_requested_time = current_time
             self.is_holding_jump = True
         else: self.is_holding_jump = False
         if self.jump_requested_time > 0 and current_time - self.jump_requested_time > JUMP_BUFFER_LIMIT: self.jump_requested_time = -1.0
-        target_vx_intent = 0
-        if keys[pygame.K_LEFT]: target_vx_intent -= 1; self.facing_right = False
-        if keys[pygame.K_RIGHT]: target_vx_intent += 1; self.facing_right = True
+        target_vx_intent = keys[_K_RIGHT] - keys[_K_LEFT] # -1, 0 or 1 (bools subtract as ints)
+        if target_vx_intent: self.facing_right = target_vx_intent > 0
         self._horizontal_intent = target_vx_intent
         move_factor = STICKY_MOVE_FACTOR if self.is_on_sticky_ground else 1.0
         current_move_acceleration = MOVE_ACCELERATION * move_factor
@@ -194,47 +246,40 @@ class Player:
     def set_animation(self, name):
         if self.is_dead and name != "death": return # Don't change from death anim
         if name in ANIMATIONS and self.current_animation_name != name:
-            self.current_animation_name = name; self.current_frame_index_in_sequence = 0
+            self.current_animation_name = name; self.current_frame_index_in_sequence = 0; self._cache_animation(name)
             self.animation_timer = 0.0; self.animation_finished = False
 
+    def _cache_animation(self, name):
+        """ Keeps the (start_frame, frame_count) range and seconds-per-frame of the current animation on the instance. """
+        self._current_anim_range = ANIMATIONS.get(name); self._current_anim_tpf = ANIM_TIME_PER_FRAME.get(name, ANIM_TIME_PER_FRAME["idle"])
+
     def update_animation(self, dt):
         # (Unchanged from previous version)
-        if self.current_animation_name not in ANIMATIONS: return
+        anim_name = self.current_animation_name; anim = self._current_anim_range
+        if anim is None: return
         if self.animation_finished: return
-        start_frame, frame_count = ANIMATIONS[self.current_animation_name]
+        start_frame, frame_count = anim
         if frame_count <= 0: return
 
-        if self.current_animation_name == "jump":
-            current_y = self.body.position.y
-            if self.body.velocity.y < 0: # Moving up
-                self.jump_peak_y = min(self.jump_peak_y, current_y)
-                progress = 0.0
-                if self.jump_start_y > self.jump_peak_y: progress = pygame.math.clamp((self.jump_start_y - current_y) / (self.jump_start_y - self.jump_peak_y), 0.0, 1.0) * 0.5
-                else: progress = 0.0
-            else: # Moving down
-                if self.jump_start_y > self.jump_peak_y: progress = 0.5 + pygame.math.clamp((current_y - self.jump_peak_y) / (self.jump_start_y - self.jump_peak_y), 0.0, 1.0) * 0.5
-                else: progress = 1.0
-            progress = pygame.math.clamp(progress, 0.0, 1.0)
-            self.current_frame_index_in_sequence = int(progress * (frame_count - 1))
+        if anim_name == "jump":
+            self.jump_peak_y, self.current_frame_index_in_sequence = jump_frame_index(float(self.body.position.y), float(self.body.velocity.y), float(self.jump_start_y), float(self.jump_peak_y), frame_count)
         else: # Timer-based animation
-            if self.current_animation_name == "run": anim_fps = RUN_ANIM_FPS
-            elif self.current_animation_name == "death": anim_fps = DEATH_ANIM_FPS
-            else: anim_fps = IDLE_ANIM_FPS
-            time_per_frame = 1.0 / anim_fps if anim_fps > 0 else float('inf')
+            time_per_frame = self._current_anim_tpf
             self.animation_timer += dt
             while self.animation_timer >= time_per_frame:
                 if self.animation_finished: self.animation_timer = 0; break
                 self.animation_timer -= time_per_frame; self.current_frame_index_in_sequence += 1
                 if self.current_frame_index_in_sequence >= frame_count:
-                    if self.current_animation_name in NON_LOOPING_ANIMATIONS: self.current_frame_index_in_sequence = frame_count - 1; self.animation_finished = True
+                    if anim_name in NON_LOOPING_ANIMATIONS: self.current_frame_index_in_sequence = frame_count - 1; self.animation_finished = True
                     else: self.current_frame_index_in_sequence = 0
 
     # --- MODIFIED update ---
-    def update(self, dt, space):
-        """ Updates player state, handling death animation. """
+    def update(self, dt, space, now):
+        """ Updates player state, handling death animation. now: the frame's time.perf_counter() reading. """
         # --- Update Animation First, especially for Death ---
         # This ensures the death animation progresses even if other updates are skipped
         self.update_animation(dt)
+        self._flash_on = False # Set below while invincible and alive
 
         # --- Freeze player after death animation finishes ---
         if self.is_dead and self.animation_finished:
@@ -252,12 +297,13 @@ class Player:
 
         # --- Normal Updates (Invincibility, Ground Check, etc.) ---
         if self.invincible_timer > 0: self.invincible_timer -= dt; self.invincible_timer = max(0, self.invincible_timer)
+        self._flash_on = self.invincible_timer > 0 and (int(now * 10) & 1) == 0 # Blink at 5 Hz, read by draw
         was_on_ground = self.on_ground; self._update_ground_contact(space)
-        if self.on_ground and not was_on_ground: self.last_on_ground_time = time.time(); self.is_jumping_state = False
+        if self.on_ground and not was_on_ground: self.last_on_ground_time = now; self.is_jumping_state = False
         if self.on_ground: self.variable_jump_timer = 0
         elif ENABLE_VARIABLE_JUMP and self.is_holding_jump and self.variable_jump_timer > 0 and self.body.velocity.y < 0:
              gravity = space.gravity;
-             if gravity.y > 0: counter_gravity_force_y = -gravity.y*self.body.mass*(1.0-VARIABLE_JUMP_MULTIPLIER); self.body.apply_force_at_local_point((0, counter_gravity_force_y), (0,0))
+             if gravity.y > 0: counter_gravity_force_y = -gravity.y * _JUMP_COUNTER_COEF; self.body.apply_force_at_local_point((0, counter_gravity_force_y), (0,0))
              self.variable_jump_timer -= dt; self.variable_jump_timer = max(0, self.variable_jump_timer)
         else: self.variable_jump_timer = 0
         current_vel_magnitude_sq = self.body.velocity.dot(self.body.velocity); is_slow = current_vel_magnitude_sq < (STUCK_VELOCITY_THRESHOLD**2)
@@ -281,41 +327,31 @@ class Player:
     # --- MODIFIED draw ---
     def draw(self, screen, offset, screen_width, screen_height):
         """ Draws the correct player sprite frame at the physics body's location. """
-        frame_list = Player.SPRITE_FRAMES; fallback_frame = Player.FALLBACK_FRAME
-        if not frame_list:
-            if fallback_frame: frame_list = [fallback_frame]
-            else: return
+        frame_list = Player.SPRITE_FRAMES_R if self.facing_right else Player.SPRITE_FRAMES_L # Pre-scaled, pre-flipped
+        if not frame_list: return
 
-        anim_name = self.current_animation_name
-        if anim_name not in ANIMATIONS: anim_name = DEFAULT_ANIMATION
-        start_frame, frame_count = ANIMATIONS.get(anim_name, (0, 1))
-        if frame_count <= 0: frame_count = 1
+        anim_name = self.current_animation_name; anim = self._current_anim_range # Counts checked in load_assets
+        if anim is None: anim_name = DEFAULT_ANIMATION; anim = ANIMATIONS[anim_name]
+        start_frame, frame_count = anim
 
         current_relative_idx = max(0, min(self.current_frame_index_in_sequence, frame_count - 1))
         absolute_frame_idx = start_frame + current_relative_idx
 
-        if 0 <= absolute_frame_idx < len(frame_list): original_frame = frame_list[absolute_frame_idx]
-        else: print(f"Draw Warning: Frame index out of bounds! Anim: {anim_name}, Abs Idx: {absolute_frame_idx}, List len: {len(frame_list)}"); original_frame = fallback_frame or frame_list[0]
-
-        if PLAYER_SPRITE_SCALE != 1.0:
-             new_size = (int(original_frame.get_width() * PLAYER_SPRITE_SCALE), int(original_frame.get_height() * PLAYER_SPRITE_SCALE))
-             try: frame_to_draw = pygame.transform.smoothscale(original_frame, new_size)
-             except ValueError: frame_to_draw = pygame.transform.scale(original_frame, new_size)
-        else: frame_to_draw = original_frame
-
-        if not self.facing_right: frame_to_draw = pygame.transform.flip(frame_to_draw, True, False)
+        if not 0 <= absolute_frame_idx < len(frame_list): print(f"Draw Warning: Frame index out of bounds! Anim: {anim_name}, Abs Idx: {absolute_frame_idx}, List len: {len(frame_list)}"); absolute_frame_idx = 0
+        frame_to_draw = frame_list[absolute_frame_idx]
 
-        body_pos_screen = self.body.position - offset
-        sprite_width = frame_to_draw.get_width(); sprite_height = frame_to_draw.get_height()
-        draw_x = body_pos_screen.x - sprite_width / 2; draw_y = (body_pos_screen.y + PLAYER_RADIUS) - sprite_height
+        body_x, body_y = self.body.position; body_x -= offset.x; body_y -= offset.y # Screen position as scalars, no Vec2d
+        sprite_width, sprite_height = Player.SCALED_FRAME_SIZES[absolute_frame_idx]
+        draw_x = body_x - sprite_width / 2; draw_y = (body_y + PLAYER_RADIUS) - sprite_height
 
         if draw_x + sprite_width >= 0 and draw_x <= screen_width and draw_y + sprite_height >= 0 and draw_y <= screen_height:
             # --- Don't show invincibility flash when dead ---
-            if self.invincible_timer > 0 and int(time.time() * 10) % 2 == 0 and not self.is_dead:
-                 tint_surf = frame_to_draw.copy(); tint_surf.fill((255, 50, 50, 100), special_flags=pygame.BLEND_RGBA_ADD); screen.blit(tint_surf, (int(draw_x), int(draw_y)))
+            if self._flash_on:
+                 tint_list = Player.SPRITE_FRAMES_R_TINT if self.facing_right else Player.SPRITE_FRAMES_L_TINT
+                 screen.blit(tint_list[absolute_frame_idx], (int(draw_x), int(draw_y)))
             else: screen.blit(frame_to_draw, (int(draw_x), int(draw_y)))
             # Debug Draw Hitbox
-            # pygame.draw.circle(screen, (255, 0, 0, 100), body_pos_screen, PLAYER_RADIUS, 1)
+            # pygame.draw.circle(screen, (255, 0, 0, 100), (body_x, body_y), PLAYER_RADIUS, 1)
 
     def add_to_space(self, space):
         if self.body not in space.bodies: space.add(self.body)
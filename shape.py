@@ -2,6 +2,7 @@
 import pygame
 import pymunk
 from pymunk import Vec2d
+import math
 
 # Constants
 SHAPE_DEFAULT_SIZE = 80 # Base size used for default triangle vertices
@@ -32,12 +33,16 @@ class Shape:
         elif shape_type == 'Triangle':
             s = SHAPE_DEFAULT_SIZE # Base size for canonical vertices
             # Define the UN SCALED, canonical vertices relative to (0,0)
-            self.original_vertices = [Vec2d(-s//2, s//3), Vec2d(s//2, s//3), Vec2d(0, -2*s//3)] # Example equilateral base, adjust as needed
+            self.original_vertices = ((-s//2, s//3), (s//2, s//3), (0, -2*s//3)) # Example equilateral base, adjust as needed. Plain tuples, never mutated
             # Apply initial scale if provided (e.g., loading from save)
             self.scale = size_params.get('scale', 1.0) if size_params else 1.0
             # Calculate initial runtime vertices
             self._update_scaled_vertices()
 
+        # World-space polygon vertices, reused while (shape, position, angle) is unchanged - i.e. every frame for static shapes
+        self._cached_transform_key = None; self._cached_world_vertices = None
+        self._cached_screen_key = None; self._cached_screen_points = None # Integer screen points for the last (vertices, camera offset)
+
         # Create physics objects
         self.body = None; self.shape = None
         self._recreate_physics_objects(space, initial_pos, initial_angle)
@@ -46,8 +51,8 @@ class Shape:
     def _update_scaled_vertices(self):
         """ Calculates self.vertices based on self.original_vertices and self.scale. """
         if self.shape_type == 'Triangle' and self.original_vertices:
-            # Multiply each original vertex vector by the scale factor
-            self.vertices = [(v * self.scale) for v in self.original_vertices]
+            # Multiply each original vertex by the scale factor (float tuples, no Vec2d operator dispatch)
+            scale = self.scale; self.vertices = [(x * scale, y * scale) for x, y in self.original_vertices]
         else:
             # Ensure self.vertices is None if not a triangle or no originals
             self.vertices = None
@@ -90,25 +95,34 @@ class Shape:
         position = new_pos if new_pos is not None else self.body.position
         angle = new_angle if new_angle is not None else self.body.angle
 
-        resize_param_updated = False
+        resize_param_updated = False; size_unchanged = False
         if self.shape_type == 'Circle':
             new_radius = new_size_params.get('radius')
-            if new_radius is not None and new_radius > 0: self.radius = new_radius; resize_param_updated = True
+            if new_radius is not None and new_radius > 0:
+                size_unchanged = self.radius is not None and abs(new_radius - self.radius) < 1e-3
+                self.radius = new_radius; resize_param_updated = True
             else: print("Resize Error: Invalid radius for Circle.")
         elif self.shape_type == 'Rectangle':
             new_size = new_size_params.get('size') # Expecting Vec2d
-            if isinstance(new_size, Vec2d) and new_size.x > 0 and new_size.y > 0: self.size = new_size; resize_param_updated = True
+            if isinstance(new_size, Vec2d) and new_size.x > 0 and new_size.y > 0:
+                size_unchanged = self.size is not None and (new_size - self.size).length < 1e-3
+                self.size = new_size; resize_param_updated = True
             # Handle tuple/list conversion if needed from older command saves? Safer not to rely on this.
             # elif isinstance(new_size, (list, tuple))...
             else: print(f"Resize Error: Invalid size Vec2d for Rectangle: {new_size}")
         elif self.shape_type == 'Triangle':
             new_scale = new_size_params.get('scale')
             if new_scale is not None and new_scale > 0.01: # Add a minimum scale check
-                self.scale = new_scale
-                self._update_scaled_vertices() # Recalculate runtime vertices
+                size_unchanged = abs(new_scale - self.scale) < 1e-4
+                if not size_unchanged: self.scale = new_scale; self._update_scaled_vertices() # Recalculate runtime vertices
                 resize_param_updated = True
             else: print("Resize Error: Invalid scale for Triangle.")
 
+        if resize_param_updated and size_unchanged and self.body and self.shape:
+            # Same geometry: move the existing body instead of rebuilding body + shape in the space
+            if position != self.body.position or angle != self.body.angle:
+                self.body.position = position; self.body.angle = angle; space.reindex_shapes_for_body(self.body)
+            return True
         if resize_param_updated:
             return self._recreate_physics_objects(space, position, angle)
         else:
@@ -130,21 +144,40 @@ class Shape:
         if self.properties.get('Spinning'): color = (255, 105, 180)
         screen_width=screen.get_width(); screen_height=screen.get_height()
         if isinstance(self.shape, pymunk.Poly):
-            # --- Draw using current runtime vertices ---
-            world_vertices = [self.body.local_to_world(v) - offset for v in self.shape.get_vertices()]
-            # Basic check if any part might be visible (using bounding box is better)
-            bb = self.shape.bb # Use shape's bounding box
-            if bb.right >= offset.x and bb.left <= offset.x + screen_width and bb.bottom >= offset.y and bb.top <= offset.y + screen_height:
-                 pygame.draw.polygon(screen, color, [(int(v.x), int(v.y)) for v in world_vertices])
+            # Cull on the bounding box first so off-screen polygons skip the vertex transforms (bb.bottom is min y, bb.top max y)
+            bb = self.shape.bb
+            if bb.right >= offset.x and bb.left <= offset.x + screen_width and bb.top >= offset.y and bb.bottom <= offset.y + screen_height:
+                 # --- Draw using current runtime vertices ---
+                 pygame.draw.polygon(screen, color, self._screen_points(offset.x, offset.y))
         elif isinstance(self.shape, pymunk.Circle):
-            pos = self.body.position - offset; current_radius = getattr(self.shape, 'radius', 1)
-            if -current_radius < pos.x < screen_width + current_radius and -current_radius < pos.y < screen_height + current_radius:
-                pygame.draw.circle(screen, color, pos, int(current_radius)) # Use Vec2d pos directly
-                angle = self.body.angle; dot_offset = Vec2d(current_radius * 0.8, 0).rotated(angle); dot_pos = self.body.position + dot_offset - offset
-                pygame.draw.circle(screen, (0,0,0), dot_pos, 4) # Use Vec2d pos directly
+            sx, sy = self.body.position; sx -= offset.x; sy -= offset.y; current_radius = getattr(self.shape, 'radius', 1)
+            if -current_radius < sx < screen_width + current_radius and -current_radius < sy < screen_height + current_radius:
+                pygame.draw.circle(screen, color, (sx, sy), int(current_radius))
+                angle = self.body.angle; dot_dist = current_radius * 0.8 # Marker dot shows rotation
+                pygame.draw.circle(screen, (0,0,0), (sx + dot_dist * math.cos(angle), sy + dot_dist * math.sin(angle)), 4)
         if self.selected:
-            pos = self.body.position - offset
-            if 0 < pos.x < screen_width and 0 < pos.y < screen_height: pygame.draw.circle(screen, (0, 255, 0), pos, 10, 2) # Use Vec2d pos directly
+            sx, sy = self.body.position; sx -= offset.x; sy -= offset.y
+            if 0 < sx < screen_width and 0 < sy < screen_height: pygame.draw.circle(screen, (0, 255, 0), (sx, sy), 10, 2)
+
+    def _world_vertices(self):
+        """ Polygon vertices in world space as (x, y) floats. Recomputed only when the shape, position or angle changed. """
+        body = self.body; key = (self.shape, body.position, body.angle)
+        if key != self._cached_transform_key:
+            px, py = body.position; c = math.cos(body.angle); s = math.sin(body.angle) # One rotation for all vertices
+            self._cached_world_vertices = [(px + vx * c - vy * s, py + vx * s + vy * c) for vx, vy in self.shape.get_vertices()]
+            self._cached_transform_key = key
+        return self._cached_world_vertices
+
+    def set_world_vertices(self, world_vertices):
+        """ Stores polygon world vertices computed elsewhere (GameWorld's batched pass) for the body's current pose. """
+        body = self.body; self._cached_transform_key = (self.shape, body.position, body.angle); self._cached_world_vertices = world_vertices
+
+    def _screen_points(self, ox, oy):
+        """ Integer screen-space polygon points. Rebuilt only when the world vertices or the camera offset changed. """
+        world_vertices = self._world_vertices(); key = (self._cached_transform_key, ox, oy)
+        if key != self._cached_screen_key:
+            self._cached_screen_points = [(int(x - ox), int(y - oy)) for x, y in world_vertices]; self._cached_screen_key = key
+        return self._cached_screen_points
 
     def update(self, dt): pass
 
@@ -167,6 +200,14 @@ class Shape:
         # Setting self.shape/body to None might be safer after removal
         # self.shape = None; self.body = None; # Consider this if issues arise
 
+    def get_pose_bounds(self):
+        """ (left, bottom, right, top) in world space from the body's current pose; unlike shape.bb, valid before Pymunk reindexes a moved body. """
+        if not self.shape: return None
+        if isinstance(self.shape, pymunk.Circle):
+            px, py = self.body.position; r = self.shape.radius; return (px - r, py - r, px + r, py + r)
+        world_vertices = self._world_vertices(); xs = [x for x, _ in world_vertices]; ys = [y for _, y in world_vertices]
+        return (min(xs), min(ys), max(xs), max(ys))
+
     def get_bounding_box(self):
         if self.shape: return self.shape.bb
         return None
\ No newline at end of file
@@ -17,7 +17,7 @@ class BaseState:
         pass
 
     def draw(self, screen):
-        """Draw everything for this state."""
+        """Draw everything for this state. Return False to report an unchanged frame (the display is not flipped), or a list of changed rects to present only those."""
         pass
 
     def enter_state(self, previous_state_data=None):
@@ -1,4 +1,5 @@
 # states/editor_state.py
+import logging
 import pygame
 from pymunk import Vec2d
 from collections import deque
@@ -11,36 +12,60 @@ from ui_elements import RadialMenu
 # --- Import Commands ---
 from commands import (Command, PlaceShapeCommand, DeleteShapeCommand, MoveShapeCommand,
                       TogglePropertyCommand, ResizeShapeCommand, SetMarkerCommand,
-                      AddCheckpointCommand, RemoveCheckpointCommand)
+                      AddCheckpointCommand, RemoveCheckpointCommand, UndoneCommand)
 from typing import TYPE_CHECKING, Optional
 if TYPE_CHECKING:
     from shape import Shape
 
+log = logging.getLogger(__name__)
+
 # Editor Specific Constants
 EDGE_SCROLL_ZONE = 40
 EDGE_SCROLL_SPEED = 600
-UNDO_LIMIT = 10 # Moved outside the class
+UNDO_LIMIT = 10 # Moved outside the class. Capacity of the history ring
 RESIZE_HANDLE_SIZE = 8
 RESIZE_HANDLE_COLOR = (255, 0, 255) # Magenta
 SCROLL_WHEEL_SPEED_FACTOR = 50 # Adjust sensitivity
+SELECTION_REDRAW_PAD = 16 # Margin around a selected shape's box covering its selection ring and resize handles
+# Resize handle -> (x sign, y sign) of the edge it drags: right / top grow with +delta, left / bottom with -delta
+HANDLE_SIGNS = {"tl": (-1, 1), "tm": (0, 1), "tr": (1, 1), "ml": (-1, 0), "mr": (1, 0), "bl": (-1, -1), "bm": (0, -1), "br": (1, -1)}
+
+EDITOR_EVENT_TYPES = [pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.KEYDOWN, pygame.VIDEOEXPOSE]
 
-PLACEMENT_TOOLS = ['Rectangle', 'Circle', 'Triangle']
-MARKER_TOOLS = ['Start', 'End', 'Checkpoint']
+PLACEMENT_TOOLS = frozenset(('Rectangle', 'Circle', 'Triangle'))
+MARKER_TOOLS = frozenset(('Start', 'End', 'Checkpoint'))
+DESELECTING_TOOLS = PLACEMENT_TOOLS | MARKER_TOOLS # Picking one of these drops the current selection
+# Marker tool -> builder of the command that places it at a world position
+MARKER_FACTORY = {'Start': lambda editor, pos: SetMarkerCommand(editor, 'start', pos),
+                  'End': lambda editor, pos: SetMarkerCommand(editor, 'end', pos),
+                  'Checkpoint': lambda editor, pos: AddCheckpointCommand(editor, pos)}
 
 
 class EditorState(BaseState):
     def __init__(self, screen_dims):
         super().__init__()
         self.screen_width, self.screen_height = screen_dims
+        # Edge-scroll trigger lines in screen pixels
+        self._right_scroll_edge = self.screen_width - EDGE_SCROLL_ZONE; self._bottom_scroll_edge = self.screen_height - EDGE_SCROLL_ZONE; self._top_scroll_edge = TOOLBAR_HEIGHT + EDGE_SCROLL_ZONE
         self.game_world = GameWorld(self.screen_width, self.screen_height)
         self.toolbar = Toolbar() # Toolbar no longer holds properties
+        self.toolbar.set_deselect_callback(self._deselect_shape_if_needed)
         self.selected_shape_instance: Optional['Shape'] = None
-        self.undo_stack = deque(maxlen=UNDO_LIMIT)
-        self.redo_stack = deque(maxlen=UNDO_LIMIT)
+        # Linear undo history: commands [0, history_head) are applied, [history_head, len) are undone and redoable
+        self.history = deque(maxlen=UNDO_LIMIT); self.history_head = 0
         self.dragging_action = None; self.drag_start_mouse_world = None
         self.drag_shape_start_pos = None; self.resize_handle_dragged = None
         self.resize_start_shape_params = None; self.resize_start_shape_pos = None
         self.resize_start_shape_angle = None; self.shape_being_dragged = None
+        self._handles_cache = None; self._handles_cache_key = None # Resize handle rects for the selected shape
+        self._handle_surface = self._make_handle_surface() # One pre-drawn handle, blitted at every handle position
+        self._pending_drag_mouse_pos = None # Latest screen position of a move drag, applied once per frame in update
+        self._needs_reindex = None # Dragged shape whose Pymunk spatial index is stale (body moved, reindex deferred)
+        self._dirty = True # Something visible changed since the last draw; an idle editor skips drawing and flipping
+        self._full_redraw = True # Change may touch anywhere on screen; otherwise only the overlay regions are pushed to the display
+        self._last_overlay_rects = [] # Screen areas of the selection / handles / menu presented last frame
+        self._event_handlers = {pygame.MOUSEBUTTONDOWN: self._handle_mouse_down, pygame.MOUSEBUTTONUP: self._handle_mouse_up,
+                                 pygame.MOUSEMOTION: self._handle_mouse_motion, pygame.KEYDOWN: self._handle_key_down}
 
         # --- Create Radial Menu Instance ---
         self.radial_menu = RadialMenu(self) # Pass self (EditorState) as context
@@ -48,21 +73,27 @@ class EditorState(BaseState):
         # Initial setup
         self.game_world.load_level_data(); self.game_world.set_gravity((0, 0)); self.game_world.reset_camera(); self._clear_undo_redo()
 
-    # --- Undo/Redo and Command Execution (Unchanged) ---
-    def _clear_undo_redo(self): self.undo_stack.clear(); self.redo_stack.clear()
+    # --- Undo/Redo and Command Execution ---
+    def _clear_undo_redo(self):
+        self.history.clear(); self.history_head = 0
     def execute_command(self, command: Command):
-        if command: command.execute(); self.undo_stack.append(command); self.redo_stack.clear(); print(f"Undo stack size: {len(self.undo_stack)}")
+        if not command: return
+        command.execute(); history = self.history
+        # Editing after an undo keeps the undone commands: their rewinds are recorded as markers instead of discarding them
+        new_entries = [UndoneCommand(history[i]) for i in range(len(history) - 1, self.history_head - 1, -1)]; new_entries.append(command)
+        history.extend(new_entries); self.history_head = len(history); log.debug("Undo history size: %s", len(history))
     def undo_last_command(self):
-        if self.undo_stack: command=self.undo_stack.pop(); command.undo(); self.redo_stack.append(command); print("Action undone."); print(f"Undo:{len(self.undo_stack)},Redo:{len(self.redo_stack)}")
-        else: print("Nothing to undo.")
+        if self.history_head > 0: self.history_head -= 1; self.history[self.history_head].undo(); log.debug("Action undone. Undo:%s,Redo:%s", self.history_head, len(self.history) - self.history_head)
+        else: log.debug("Nothing to undo.")
     def redo_last_command(self):
-        if self.redo_stack: command=self.redo_stack.pop(); command.execute(); self.undo_stack.append(command); print("Action redone."); print(f"Undo:{len(self.undo_stack)},Redo:{len(self.redo_stack)}")
-        else: print("Nothing to redo.")
+        if self.history_head < len(self.history): self.history[self.history_head].execute(); self.history_head += 1; log.debug("Action redone. Undo:%s,Redo:%s", self.history_head, len(self.history) - self.history_head)
+        else: log.debug("Nothing to redo.")
 
     # --- MODIFIED select_shape ---
-    def select_shape(self, shape_instance: Optional['Shape']):
-        """ Safely selects a shape, deselects previous, updates toolbar, shows/hides radial menu. """
-        self.dragging_action = None; self.shape_being_dragged = None # Cancel drag
+    def select_shape(self, shape_instance: Optional['Shape'], show_menu=True):
+        """ Safely selects a shape, deselects previous, updates toolbar, shows/hides radial menu (show_menu=False keeps it closed, e.g. when a drag starts). """
+        self.dragging_action = None; self.shape_being_dragged = None; self._pending_drag_mouse_pos = None # Cancel drag
+        self._invalidate_handles()
 
         if self.selected_shape_instance and self.selected_shape_instance != shape_instance:
              self.selected_shape_instance.selected = False
@@ -78,43 +109,61 @@ class EditorState(BaseState):
              # Toolbar no longer needs properties: self.toolbar.current_properties = self.selected_shape_instance.properties.copy()
              self.toolbar.set_active_tool('Select')
              # --- Show Radial Menu ---
-             shape_screen_pos = self.game_world._world_to_screen(self.selected_shape_instance.body.position)
-             self.radial_menu.show(shape_screen_pos, self.selected_shape_instance)
+             if show_menu: self._show_radial_menu()
         # else: Menu is already hidden if selection changed to None
 
 
+    def _show_radial_menu(self):
+        """ Opens the radial menu centred on the selected shape's on-screen position. """
+        px, py = self.selected_shape_instance.body.position
+        self.radial_menu.update_target(self.game_world._world_to_screen_xy(px, py), self.selected_shape_instance)
+
     def enter_state(self, previous_state_data=None):
         super().enter_state(); self.game_world.set_gravity((0, 0))
-        if previous_state_data and isinstance(previous_state_data.get('game_world'), GameWorld): self.game_world = previous_state_data['game_world']; print("EditorState received existing GameWorld.")
+        if previous_state_data and isinstance(previous_state_data.get('game_world'), GameWorld): self.game_world = previous_state_data['game_world']; log.debug("EditorState received existing GameWorld.")
         self.game_world.remove_player(); self.game_world.last_checkpoint_activated = None
         self.select_shape(None); self._clear_undo_redo(); self.toolbar.set_active_tool('Select');
         self.radial_menu.hide() # Ensure menu hidden on state entry
         pygame.display.set_caption("Level Editor Mode - Ctrl+Z/Y Undo/Redo")
+        pygame.event.set_blocked(None); pygame.event.set_allowed(EDITOR_EVENT_TYPES) # SDL drops everything the editor ignores
+        self._dirty = True; self._full_redraw = True
 
     def exit_state(self):
-        super().exit_state(); self.select_shape(None);
+        super().exit_state(); self.select_shape(None); self._flush_reindex(); pygame.event.set_allowed(None) # Next state gets the full event stream again
         self.radial_menu.hide() # Hide menu on exit
         return {'game_world': self.game_world}
 
     def _deselect_shape_if_needed(self, new_tool):
-         tools_causing_deselect = PLACEMENT_TOOLS + MARKER_TOOLS
-         if self.selected_shape_instance and new_tool in tools_causing_deselect:
+         if self.selected_shape_instance and new_tool in DESELECTING_TOOLS:
              self.select_shape(None) # This now also hides the radial menu
 
     def _get_resize_handles(self):
-        # (Unchanged)
         handles = {};
         if not self.selected_shape_instance or not self.selected_shape_instance.shape: return handles
+        # Reuse the last rects while the shape (geometry, pose) and camera are unchanged
+        shape_obj = self.selected_shape_instance; body = shape_obj.body
+        cache_key = (id(shape_obj), shape_obj.shape, body.position, body.angle, self.game_world.camera_offset)
+        if cache_key == self._handles_cache_key: return self._handles_cache
         bb = self.selected_shape_instance.get_bounding_box();
         if not bb: return handles
-        world_tl=Vec2d(bb.left,bb.top); world_br=Vec2d(bb.right,bb.bottom); world_tr=Vec2d(bb.right,bb.top); world_bl=Vec2d(bb.left,bb.bottom)
-        world_tm=world_tl.interpolate_to(world_tr,0.5); world_bm=world_bl.interpolate_to(world_br,0.5); world_ml=world_tl.interpolate_to(world_bl,0.5); world_mr=world_tr.interpolate_to(world_br,0.5)
-        handle_points_world={"tl":world_tl,"tm":world_tm,"tr":world_tr,"ml":world_ml,"mr":world_mr,"bl":world_bl,"bm":world_bm,"br":world_br}
-        half_handle=RESIZE_HANDLE_SIZE//2
-        for name, world_pos in handle_points_world.items():
-            screen_pos=self.game_world._world_to_screen(world_pos); handles[name]=pygame.Rect(screen_pos.x-half_handle,screen_pos.y-half_handle,RESIZE_HANDLE_SIZE,RESIZE_HANDLE_SIZE)
+        # Shift the bounding box into screen space once; edges and midpoints are then plain float arithmetic
+        cam = self.game_world.camera_offset; h = RESIZE_HANDLE_SIZE // 2; size = RESIZE_HANDLE_SIZE
+        left = bb.left - cam.x - h; right = bb.right - cam.x - h; top = bb.top - cam.y - h; bottom = bb.bottom - cam.y - h
+        mid_x = (left + right) * 0.5; mid_y = (top + bottom) * 0.5
+        handles = {"tl": pygame.Rect(left, top, size, size), "tm": pygame.Rect(mid_x, top, size, size), "tr": pygame.Rect(right, top, size, size),
+                   "ml": pygame.Rect(left, mid_y, size, size), "mr": pygame.Rect(right, mid_y, size, size),
+                   "bl": pygame.Rect(left, bottom, size, size), "bm": pygame.Rect(mid_x, bottom, size, size), "br": pygame.Rect(right, bottom, size, size)}
+        self._handles_cache = handles; self._handles_cache_key = cache_key
         return handles
 
+    @staticmethod
+    def _make_handle_surface():
+        """ Magenta square with a 1px black border, the look of a single resize handle. """
+        surf = pygame.Surface((RESIZE_HANDLE_SIZE, RESIZE_HANDLE_SIZE)); surf.fill(RESIZE_HANDLE_COLOR)
+        pygame.draw.rect(surf, (0, 0, 0), surf.get_rect(), 1); return surf.convert()
+
+    def _invalidate_handles(self): self._handles_cache = None; self._handles_cache_key = None
+
     def _get_current_size_params_for_command(self, shape_obj: Optional['Shape']) -> dict:
         # (Unchanged)
         if not shape_obj: return {}
@@ -127,6 +176,10 @@ class EditorState(BaseState):
 
     # --- MODIFIED handle_event ---
     def handle_event(self, event):
+        # Every event the editor receives can change what is on screen. Plain motion only moves hover highlights
+        # or (via update) the dragged shape, both inside the overlay regions; anything else presents the full frame.
+        self._dirty = True
+        if event.type != pygame.MOUSEMOTION: self._full_redraw = True
         # --- 1. Give Radial Menu first chance to handle event ---
         if self.radial_menu.handle_event(event):
             return # Event was handled by the menu (e.g., button click)
@@ -135,108 +188,127 @@ class EditorState(BaseState):
         # Toolbar no longer calls set_property, only updates its own state
         self.toolbar.handle_event(event, self)
 
-        # --- 3. World Interaction ---
-        mouse_pos_screen = None; world_pos = None
-        if event.type in [pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION]:
-            mouse_pos_screen = event.pos; world_pos = self.game_world._screen_to_world(mouse_pos_screen)
-
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            if not mouse_pos_screen or mouse_pos_screen[1] <= TOOLBAR_HEIGHT: return # Outside world or toolbar click
-            can_interact = (0 <= world_pos.x <= MAP_WIDTH and 0 <= world_pos.y <= MAP_HEIGHT)
-            if not can_interact: self.select_shape(None); return # Deselects & hides menu
-
-            # Interaction logic (Handles -> Shape -> Empty Space)
-            clicked_on_handle = None
-            if self.selected_shape_instance and self.toolbar.selected_tool == 'Select':
-                handles = self._get_resize_handles();
-                for name, rect in handles.items():
-                    if rect.collidepoint(mouse_pos_screen): clicked_on_handle = name; break
-
-            if clicked_on_handle: # Start Resize
-                 self.dragging_action = "resize"; self.resize_handle_dragged = clicked_on_handle
-                 self.drag_start_mouse_world = world_pos
-                 self.resize_start_shape_params = self._get_current_size_params_for_command(self.selected_shape_instance)
-                 self.resize_start_shape_pos = Vec2d(self.selected_shape_instance.body.position.x, self.selected_shape_instance.body.position.y)
-                 self.resize_start_shape_angle = self.selected_shape_instance.body.angle
-                 print(f"Starting resize via handle: {clicked_on_handle}")
-                 self.radial_menu.hide() # Hide menu while resizing
-            else: # Check Shape Click
-                clicked_shape = None
-                for shape_obj in reversed(self.game_world.shapes):
-                    if shape_obj and shape_obj.shape and shape_obj.body and shape_obj.shape.point_query(world_pos).distance <= 0:
-                        clicked_shape = shape_obj; break
-                if clicked_shape: # Select and start Move
-                     self.select_shape(clicked_shape) # Selects, shows menu, sets tool='Select'
-                     if self.toolbar.selected_tool == 'Select': # Should always be true now after select
-                          self.dragging_action = "move"; self.shape_being_dragged = clicked_shape
-                          self.drag_start_mouse_world = world_pos; self.drag_shape_start_pos = Vec2d(clicked_shape.body.position.x, clicked_shape.body.position.y); print(f"Starting move")
-                          self.radial_menu.hide() # Hide menu while moving
-                else: # Clicked Empty Space -> Deselect or Place
-                     self.select_shape(None) # Deselects & hides menu
-                     self.dragging_action = None
-                     current_tool = self.toolbar.selected_tool
-                     if current_tool in MARKER_TOOLS: # Place marker
-                          if current_tool == 'Start': command = SetMarkerCommand(self, 'start', world_pos); self.execute_command(command)
-                          elif current_tool == 'End': command = SetMarkerCommand(self, 'end', world_pos); self.execute_command(command)
-                          elif current_tool == 'Checkpoint': command = AddCheckpointCommand(self, world_pos); self.execute_command(command)
-                     elif current_tool in PLACEMENT_TOOLS: # Place shape
-                          # Use toolbar's last known defaults for properties when placing
-                          shape_data = {'type': current_tool,'position': world_pos.int_tuple,'properties': self.toolbar.current_properties.copy()}
-                          command = PlaceShapeCommand(self, shape_data); self.execute_command(command)
-                          # Place command now selects the new shape & shows menu
-
-        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-            # (Mouse Button Up logic remains the same - finalize move/resize commands)
-            if world_pos is None: world_pos = self.game_world._screen_to_world(pygame.mouse.get_pos())
-            if self.dragging_action == "move" and self.shape_being_dragged:
-                 final_body_pos = Vec2d(self.shape_being_dragged.body.position.x, self.shape_being_dragged.body.position.y)
-                 self.game_world.space.reindex_shapes_for_body(self.shape_being_dragged.body)
-                 if self.drag_shape_start_pos and (final_body_pos - self.drag_shape_start_pos).length > 1.0: command = MoveShapeCommand(self, self.shape_being_dragged, self.drag_shape_start_pos, final_body_pos); self.execute_command(command)
-                 elif self.drag_shape_start_pos: self.shape_being_dragged.body.position = self.drag_shape_start_pos; self.game_world.space.reindex_shapes_for_body(self.shape_being_dragged.body)
-            elif self.dragging_action == "resize" and self.selected_shape_instance:
-                 new_params = self._calculate_final_resize(world_pos)
-                 if self.resize_start_shape_params is not None:
-                     if new_params and new_params != self.resize_start_shape_params: command = ResizeShapeCommand(self, self.selected_shape_instance, new_params); self.execute_command(command); self.select_shape(self.selected_shape_instance) # Reselect to show menu again
-                     else: self.selected_shape_instance.resize(self.resize_start_shape_params, self.game_world.space, new_pos=self.resize_start_shape_pos, new_angle=self.resize_start_shape_angle); print("Resize cancelled or failed."); self.select_shape(self.selected_shape_instance) # Reselect even if cancelled
-                 else: print("Error: Cannot finalize resize, missing start parameters.")
-            # Reset dragging state
-            self.dragging_action = None; self.shape_being_dragged = None; self.drag_start_mouse_world = None; self.drag_shape_start_pos = None; self.resize_handle_dragged = None; self.resize_start_shape_params = None; self.resize_start_shape_pos = None; self.resize_start_shape_angle = None
-            # Re-show menu if a shape is still selected after drag/resize ends
-            if self.selected_shape_instance:
-                 shape_screen_pos = self.game_world._world_to_screen(self.selected_shape_instance.body.position)
-                 self.radial_menu.show(shape_screen_pos, self.selected_shape_instance)
-
-
-        elif event.type == pygame.MOUSEMOTION:
-            # (Mouse motion logic for drag move unchanged, resize preview skipped)
-            if world_pos is None: return
-            if self.dragging_action == "move" and self.shape_being_dragged:
-                if self.drag_start_mouse_world and self.drag_shape_start_pos: mouse_delta = world_pos - self.drag_start_mouse_world; new_shape_pos = Vec2d(self.drag_shape_start_pos.x + mouse_delta.x, self.drag_shape_start_pos.y + mouse_delta.y); self.shape_being_dragged.body.position = new_shape_pos; self.game_world.space.reindex_shapes_for_body(self.shape_being_dragged.body)
-            elif self.dragging_action == "resize" and self.selected_shape_instance: pass
-
-        elif event.type == pygame.KEYDOWN:
-            # (Key handling unchanged: ESC, DEL, Save/Load, TAB, Undo/Redo)
-            mods = pygame.key.get_mods(); is_ctrl = mods & pygame.KMOD_CTRL; is_shift = mods & pygame.KMOD_SHIFT
-            if event.key == pygame.K_ESCAPE:
-                print("ESC pressed - Deselecting shape/cancelling drag."); was_dragging = self.dragging_action == "move" and self.shape_being_dragged; was_resizing = self.dragging_action == "resize" and self.selected_shape_instance
-                shape_to_snap = self.shape_being_dragged or self.selected_shape_instance
-                self.select_shape(None); self.dragging_action = None # Deselect hides menu
-                if shape_to_snap:
-                    if was_dragging and self.drag_shape_start_pos: shape_to_snap.body.position = self.drag_shape_start_pos; self.game_world.space.reindex_shapes_for_body(shape_to_snap.body)
-                    elif was_resizing and self.resize_start_shape_params: self.selected_shape_instance.resize(self.resize_start_shape_params, self.game_world.space, new_pos=self.resize_start_shape_pos, new_angle=self.resize_start_shape_angle)
-                self.shape_being_dragged = None; self.drag_start_mouse_world = None; self.drag_shape_start_pos = None; self.resize_handle_dragged = None; self.resize_start_shape_params = None; self.resize_start_shape_pos = None; self.resize_start_shape_angle = None
-            elif event.key == pygame.K_DELETE or event.key == pygame.K_BACKSPACE:
-                 if self.selected_shape_instance: command = DeleteShapeCommand(self, self.selected_shape_instance); self.execute_command(command) # This will deselect via command
-            elif event.key == pygame.K_s and is_ctrl: self.game_world.save_level_data()
-            elif event.key == pygame.K_l and is_ctrl:
-                 if self.game_world.load_level_data(): self.select_shape(None); self._clear_undo_redo()
-                 else: print("Failed to load level.")
-            elif event.key == pygame.K_TAB:
-                 from .playing_state import PlayingState
-                 if self.game_world.start_marker: state_data = self.exit_state(); self.manager.set_state(PlayingState(state_data['game_world']))
-                 else: print("Cannot enter play mode: Start marker not set!")
-            elif event.key == pygame.K_z and is_ctrl and not is_shift: self.undo_last_command()
-            elif (event.key == pygame.K_y and is_ctrl) or (event.key == pygame.K_z and is_ctrl and is_shift): self.redo_last_command()
+        # --- 3. World Interaction (one dict lookup instead of an if/elif ladder) ---
+        handler = self._event_handlers.get(event.type)
+        if handler: handler(event)
+
+    def _handle_mouse_down(self, event):
+        if event.button != 1: return
+        mouse_pos_screen = event.pos
+        if not mouse_pos_screen or mouse_pos_screen[1] <= TOOLBAR_HEIGHT: return # Outside world or toolbar click
+        gw = self.game_world; world_pos = gw._screen_to_world(mouse_pos_screen) # Only converted once the click is known to hit the world
+        can_interact = (0 <= world_pos.x <= MAP_WIDTH and 0 <= world_pos.y <= MAP_HEIGHT)
+        if not can_interact: self.select_shape(None); return # Deselects & hides menu
+
+        # Interaction logic (Handles -> Shape -> Empty Space)
+        clicked_on_handle = None
+        if self.selected_shape_instance and self.toolbar.selected_tool == 'Select':
+            handles = self._get_resize_handles();
+            for name, rect in handles.items():
+                if rect.collidepoint(mouse_pos_screen): clicked_on_handle = name; break
+
+        if clicked_on_handle: # Start Resize
+             self.dragging_action = "resize"; self.resize_handle_dragged = clicked_on_handle
+             self.drag_start_mouse_world = world_pos
+             self.resize_start_shape_params = self._get_current_size_params_for_command(self.selected_shape_instance)
+             self.resize_start_shape_pos = Vec2d(self.selected_shape_instance.body.position.x, self.selected_shape_instance.body.position.y)
+             self.resize_start_shape_angle = self.selected_shape_instance.body.angle
+             log.debug("Starting resize via handle: %s", clicked_on_handle)
+             self.radial_menu.hide() # Hide menu while resizing
+        else: # Check Shape Click
+            self._flush_reindex() # Settle a drag that never saw its release before another can start
+            # Grid cell + bounding-box prefilter, exact point_query on survivors only; walked topmost first, so overlaps pick what is drawn on top
+            clicked_shape = gw.shape_at(world_pos.x, world_pos.y)
+            if clicked_shape: # Select and start Move
+                 # Selects and sets tool='Select'; the menu stays closed while moving and reopens on MOUSEBUTTONUP
+                 self.select_shape(clicked_shape, show_menu=False); self.radial_menu.hide()
+                 if self.toolbar.selected_tool == 'Select': # Should always be true now after select
+                      self.dragging_action = "move"; self.shape_being_dragged = clicked_shape
+                      self.drag_start_mouse_world = world_pos; self.drag_shape_start_pos = Vec2d(clicked_shape.body.position.x, clicked_shape.body.position.y); log.debug("Starting move")
+            else: # Clicked Empty Space -> Deselect or Place
+                 self.select_shape(None) # Deselects & hides menu
+                 self.dragging_action = None
+                 current_tool = self.toolbar.selected_tool
+                 if current_tool in MARKER_TOOLS: # Place marker
+                      self.execute_command(MARKER_FACTORY[current_tool](self, world_pos))
+                 elif current_tool in PLACEMENT_TOOLS: # Place shape
+                      # Use toolbar's last known defaults for properties when placing
+                      shape_data = {'type': current_tool,'position': world_pos.int_tuple,'properties': self.toolbar.current_properties.copy()}
+                      command = PlaceShapeCommand(self, shape_data); self.execute_command(command)
+                      # Place command now selects the new shape & shows menu
+
+    def _handle_mouse_up(self, event):
+        if event.button != 1: return
+        self._apply_pending_drag() # Motion queued this frame still counts towards the final position
+        gw = self.game_world
+        # (Mouse Button Up logic remains the same - finalize move/resize commands)
+        if self.dragging_action == "move" and self.shape_being_dragged:
+             final_body_pos = Vec2d(self.shape_being_dragged.body.position.x, self.shape_being_dragged.body.position.y)
+             # The body's deferred reindex happens exactly once: inside MoveShapeCommand.execute, or after snapping back
+             # Moved more than 1 unit? Compared squared, no sqrt
+             if self.drag_shape_start_pos and (final_body_pos.x - self.drag_shape_start_pos.x) ** 2 + (final_body_pos.y - self.drag_shape_start_pos.y) ** 2 > 1.0: self._needs_reindex = None; command = MoveShapeCommand(self, self.shape_being_dragged, self.drag_shape_start_pos, final_body_pos); self.execute_command(command)
+             else:
+                 if self.drag_shape_start_pos: self.shape_being_dragged.body.position = self.drag_shape_start_pos
+                 self._flush_reindex()
+        elif self.dragging_action == "resize" and self.selected_shape_instance:
+             new_params = self._calculate_final_resize(gw._screen_to_world(event.pos)) # Only the resize path needs the world position
+             if self.resize_start_shape_params is not None:
+                 if new_params and new_params != self.resize_start_shape_params: command = ResizeShapeCommand(self, self.selected_shape_instance, new_params); self.execute_command(command); self.select_shape(self.selected_shape_instance) # Reselect to show menu again
+                 else: self.selected_shape_instance.resize(self.resize_start_shape_params, gw.space, new_pos=self.resize_start_shape_pos, new_angle=self.resize_start_shape_angle); gw.mark_shapes_moved(); log.debug("Resize cancelled or failed."); self.select_shape(self.selected_shape_instance) # Reselect even if cancelled
+             else: log.error("Cannot finalize resize, missing start parameters.")
+        # Reset dragging state (handle rects are rebuilt for the final geometry)
+        self._invalidate_handles(); self.dragging_action = None; self.shape_being_dragged = None; self.drag_start_mouse_world = None; self.drag_shape_start_pos = None; self.resize_handle_dragged = None; self.resize_start_shape_params = None; self.resize_start_shape_pos = None; self.resize_start_shape_angle = None
+        # Re-show menu if a shape is still selected after drag/resize ends
+        if self.selected_shape_instance:
+             self._show_radial_menu()
+
+    def _handle_mouse_motion(self, event):
+        # Only remember where the mouse is; several motion events per frame collapse into one move in update
+        if self.dragging_action == "move" and self.shape_being_dragged: self._pending_drag_mouse_pos = event.pos
+
+    def _apply_pending_drag(self):
+        """ Moves the dragged shape to the last recorded mouse position, if any. """
+        mouse_pos_screen = self._pending_drag_mouse_pos; self._pending_drag_mouse_pos = None
+        if mouse_pos_screen is None or self.dragging_action != "move" or not self.shape_being_dragged: return
+        if not self.drag_start_mouse_world or not self.drag_shape_start_pos: return
+        # Move the body only; the spatial index is refreshed once when the drag ends (MOUSEBUTTONUP)
+        world_pos = self.game_world._screen_to_world(mouse_pos_screen); mouse_delta = world_pos - self.drag_start_mouse_world
+        dragged = self.shape_being_dragged; dragged.body.position = Vec2d(self.drag_shape_start_pos.x + mouse_delta.x, self.drag_shape_start_pos.y + mouse_delta.y)
+        # shape.bb is only recomputed on reindex; refresh this one shape's box (no BB-tree work) so culling, the grid and handles follow the drag
+        if dragged.shape: dragged.shape.cache_bb()
+        self.game_world.mark_shapes_moved()
+        self._needs_reindex = self.shape_being_dragged
+
+    def _flush_reindex(self):
+        """ Runs the one Pymunk reindex owed by a drag (on release, or before the space is queried). """
+        shape_obj = self._needs_reindex
+        self._needs_reindex = None
+        if shape_obj is not None and self.game_world.has_shape(shape_obj): self.game_world.reindex_shape(shape_obj)
+
+    def _handle_key_down(self, event):
+        gw = self.game_world
+        # (Key handling unchanged: ESC, DEL, Save/Load, TAB, Undo/Redo)
+        mods = pygame.key.get_mods(); is_ctrl = mods & pygame.KMOD_CTRL; is_shift = mods & pygame.KMOD_SHIFT; key = event.key
+        if key == pygame.K_ESCAPE:
+            log.debug("ESC pressed - Deselecting shape/cancelling drag."); was_dragging = self.dragging_action == "move" and self.shape_being_dragged; was_resizing = self.dragging_action == "resize" and self.selected_shape_instance
+            shape_to_snap = self.shape_being_dragged or self.selected_shape_instance
+            self.select_shape(None); self.dragging_action = None # Deselect hides menu
+            if shape_to_snap:
+                if was_dragging and self.drag_shape_start_pos: shape_to_snap.body.position = self.drag_shape_start_pos; self._needs_reindex = None; gw.reindex_shape(shape_to_snap)
+                elif was_resizing and self.resize_start_shape_params: shape_to_snap.resize(self.resize_start_shape_params, gw.space, new_pos=self.resize_start_shape_pos, new_angle=self.resize_start_shape_angle); gw.mark_shapes_moved()
+            self.shape_being_dragged = None; self.drag_start_mouse_world = None; self.drag_shape_start_pos = None; self.resize_handle_dragged = None; self.resize_start_shape_params = None; self.resize_start_shape_pos = None; self.resize_start_shape_angle = None
+        elif key == pygame.K_DELETE or key == pygame.K_BACKSPACE:
+             if self.selected_shape_instance: command = DeleteShapeCommand(self, self.selected_shape_instance); self.execute_command(command) # This will deselect via command
+        elif key == pygame.K_s and is_ctrl: gw.save_level_data()
+        elif key == pygame.K_l and is_ctrl:
+             if gw.load_level_data(): self.select_shape(None); self._clear_undo_redo()
+             else: log.warning("Failed to load level.")
+        elif key == pygame.K_TAB:
+             from .playing_state import PlayingState
+             if gw.start_marker: state_data = self.exit_state(); self.manager.set_state(PlayingState(state_data['game_world']))
+             else: log.warning("Cannot enter play mode: Start marker not set!")
+        elif key == pygame.K_z and is_ctrl and not is_shift: self.undo_last_command()
+        elif (key == pygame.K_y and is_ctrl) or (key == pygame.K_z and is_ctrl and is_shift): self.redo_last_command()
 
     # --- REMOVED set_property method - Toolbar no longer calls this ---
     # def set_property(self, prop_name, value):
@@ -256,57 +328,72 @@ class EditorState(BaseState):
         if shape.shape_type == 'Rectangle':
             start_size = self.resize_start_shape_params.get('size'); start_pos = self.resize_start_shape_pos
             if not start_size: return None;
-            current_size_x, current_size_y = start_size.x, start_size.y; new_x, new_y = current_size_x, current_size_y
-            if 't' in handle: new_y = max(10, start_size.y + mouse_delta.y)
-            if 'b' in handle: new_y = max(10, start_size.y - mouse_delta.y)
-            if 'l' in handle: new_x = max(10, start_size.x - mouse_delta.x)
-            if 'r' in handle: new_x = max(10, start_size.x + mouse_delta.x)
+            # Each handle moves the x / y edges by a fixed sign (0 = axis untouched); size and center shift with the same sign
+            sx, sy = HANDLE_SIGNS[handle]
+            new_x = max(10, start_size.x + sx * mouse_delta.x) if sx else start_size.x; new_y = max(10, start_size.y + sy * mouse_delta.y) if sy else start_size.y
             new_size = Vec2d(new_x, new_y);
-            if new_size.x <=0 or new_size.y <= 0: print("Resize Error: Calc size non-positive."); return None
-            new_center_x, new_center_y = start_pos.x, start_pos.y
-            if 'l' in handle: new_center_x = start_pos.x - (new_size.x - start_size.x) / 2.0
-            if 'r' in handle: new_center_x = start_pos.x + (new_size.x - start_size.x) / 2.0
-            if 't' in handle: new_center_y = start_pos.y + (new_size.y - start_size.y) / 2.0
-            if 'b' in handle: new_center_y = start_pos.y - (new_size.y - start_size.y) / 2.0
+            if new_size.x <=0 or new_size.y <= 0: log.debug("Resize Error: Calc size non-positive."); return None
+            new_center_x = start_pos.x + sx * (new_x - start_size.x) / 2.0; new_center_y = start_pos.y + sy * (new_y - start_size.y) / 2.0
             new_pos_vec = Vec2d(new_center_x, new_center_y)
-            print(f"Calculated new rect size: {new_size}, pos: {new_pos_vec}"); return {'size': new_size, 'position': new_pos_vec}
+            log.debug("Calculated new rect size: %s, pos: %s", new_size, new_pos_vec); return {'size': new_size, 'position': new_pos_vec}
         elif shape.shape_type == 'Triangle':
              start_scale = self.resize_start_shape_params.get('scale', 1.0); center_world = self.resize_start_shape_pos
              start_dist = (self.drag_start_mouse_world - center_world).length; end_dist = (final_mouse_world - center_world).length
-             if start_dist > 1: scale_multiplier = end_dist / start_dist; new_scale = max(0.1, start_scale * scale_multiplier); print(f"Calculated new triangle scale: {new_scale}"); return {'scale': new_scale}
+             if start_dist > 1: scale_multiplier = end_dist / start_dist; new_scale = max(0.1, start_scale * scale_multiplier); log.debug("Calculated new triangle scale: %s", new_scale); return {'scale': new_scale}
              else: return None
         elif shape.shape_type == 'Circle':
              start_radius = self.resize_start_shape_params.get('radius'); center_world = self.resize_start_shape_pos
              if start_radius is None: return None
              start_dist = (self.drag_start_mouse_world - center_world).length; end_dist = (final_mouse_world - center_world).length
-             if start_dist > 1: scale_factor = end_dist / start_dist; new_radius = max(5, start_radius * scale_factor); print(f"Calculated new circle radius: {new_radius}"); return {'radius': new_radius}
+             if start_dist > 1: scale_factor = end_dist / start_dist; new_radius = max(5, start_radius * scale_factor); log.debug("Calculated new circle radius: %s", new_radius); return {'radius': new_radius}
              else: return None
-        else: print(f"Resize not implemented for shape type: {shape.shape_type}"); return None
+        else: log.warning("Resize not implemented for shape type: %s", shape.shape_type); return None
 
     def update(self, dt):
-        # (Edge scrolling unchanged)
-        mouse_pos = pygame.mouse.get_pos(); dx = 0.0; dy = 0.0; scroll_speed_dt = EDGE_SCROLL_SPEED * dt
-        if mouse_pos[0] < EDGE_SCROLL_ZONE: dx = -scroll_speed_dt
-        elif mouse_pos[0] > self.screen_width - EDGE_SCROLL_ZONE: dx = scroll_speed_dt
-        if mouse_pos[1] > TOOLBAR_HEIGHT and mouse_pos[1] < TOOLBAR_HEIGHT + EDGE_SCROLL_ZONE: dy = -scroll_speed_dt
-        elif mouse_pos[1] > self.screen_height - EDGE_SCROLL_ZONE: dy = scroll_speed_dt
+        if self._pending_drag_mouse_pos is not None: self._apply_pending_drag(); self._dirty = True
+        # Edge scrolling: scalar math against edges precomputed in __init__
+        mx, my = pygame.mouse.get_pos(); dx = 0.0; dy = 0.0; scroll_speed_dt = EDGE_SCROLL_SPEED * dt
+        if mx < EDGE_SCROLL_ZONE: dx = -scroll_speed_dt
+        elif mx > self._right_scroll_edge: dx = scroll_speed_dt
+        if TOOLBAR_HEIGHT < my < self._top_scroll_edge: dy = -scroll_speed_dt
+        elif my > self._bottom_scroll_edge: dy = scroll_speed_dt
         if dx != 0 or dy != 0:
-            scroll_delta = Vec2d(dx, dy); new_offset = self.game_world.camera_offset + scroll_delta
-            max_offset_x = max(0, MAP_WIDTH - self.screen_width); max_offset_y = max(0, MAP_HEIGHT - self.screen_height)
-            clamped_x = max(0, min(new_offset.x, max_offset_x)); clamped_y = max(0, min(new_offset.y, max_offset_y))
-            self.game_world.camera_offset = Vec2d(clamped_x, clamped_y)
+            gw = self.game_world; cam = gw.camera_offset
+            new_offset = Vec2d(max(0, min(cam.x + dx, gw._cam_max_x)), max(0, min(cam.y + dy, gw._cam_max_y)))
+            if new_offset != cam: gw.camera_offset = new_offset; self._dirty = True; self._full_redraw = True
 
     # --- MODIFIED Draw Method ---
     def draw(self, screen):
+        """
+        Redraws the editor if anything changed. Returns False when the frame was skipped, True when the whole screen
+        must be presented, or the list of rects that changed (last and current overlay areas) for pygame.display.update.
+        """
+        if not self._dirty: return False
+        self._dirty = False
         screen.fill((200, 200, 200)); self.game_world.draw(screen) # Draw world first
 
         # Draw Resize Handles if shape selected AND Select tool is active
         if self.selected_shape_instance and self.toolbar.selected_tool == 'Select':
             handles = self._get_resize_handles()
-            for name, rect in handles.items(): pygame.draw.rect(screen, RESIZE_HANDLE_COLOR, rect); pygame.draw.rect(screen, (0, 0, 0), rect, 1)
+            handle_surface = self._handle_surface; screen.blits([(handle_surface, rect) for rect in handles.values()], doreturn=False)
 
         # --- Draw Radial Menu ---
         self.radial_menu.draw(screen) # Draw if visible
 
         # Draw Toolbar last
-        self.toolbar.draw(screen, self)
\ No newline at end of file
+        self.toolbar.draw(screen, self)
+
+        overlay_rects = self._overlay_rects(); changed = self._last_overlay_rects + overlay_rects; self._last_overlay_rects = overlay_rects
+        if self._full_redraw: self._full_redraw = False; return True
+        return changed
+
+    def _overlay_rects(self):
+        """ Screen rects covering the selected shape (with its selection ring and handles) and the radial menu. draw() presents these together with last frame's, so a moved shape's old and new spots both update. """
+        rects = []; shape_obj = self.selected_shape_instance
+        bounds = shape_obj.get_pose_bounds() if shape_obj else None # From the body pose: the shape may be mid-drag with its reindex deferred
+        if bounds:
+            left, bottom, right, top = bounds; cam = self.game_world.camera_offset; pad = SELECTION_REDRAW_PAD
+            rects.append(pygame.Rect(left - cam.x - pad, bottom - cam.y - pad, right - left + 2 * pad, top - bottom + 2 * pad))
+        menu_rect = self.radial_menu.get_rect()
+        if menu_rect: rects.append(menu_rect)
+        return rects
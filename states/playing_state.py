@@ -1,4 +1,5 @@
 # states/playing_state.py
+import logging
 import pygame
 from pymunk import Vec2d
 
@@ -6,23 +7,42 @@ from .base_state import BaseState
 from game_world import GameWorld
 # Import EditorState for transitioning back (use local import in method)
 
+log = logging.getLogger(__name__)
+
+# Play mode reads held keys via key.get_pressed (SDL keeps that state even for blocked events); only these reach handle_event
+PLAYING_EVENT_TYPES = [pygame.QUIT, pygame.KEYDOWN]
+
 
 class PlayingState(BaseState):
     """Handles the active gameplay."""
+    _fonts = None # (info, end message) fonts, loaded once and shared by every PlayingState
+
     def __init__(self, game_world: GameWorld): # Receive the existing GameWorld
         super().__init__()
         self.game_world = game_world
         self.screen_width = game_world.screen_width
         self.screen_height = game_world.screen_height
-        self.info_font = pygame.font.SysFont('arial', 20)
-        self.end_message_font = pygame.font.SysFont('impact', 80)
+        if PlayingState._fonts is None: PlayingState._fonts = (pygame.font.SysFont('arial', 20), pygame.font.SysFont('impact', 80))
+        self.info_font, self.end_message_font = PlayingState._fonts
         self._game_over = False
         self._level_won = False
+        # End-screen tints, filled once instead of allocating a full-screen SRCALPHA surface every frame
+        self._win_overlay = self._make_overlay((50, 50, 50, 180)); self._gameover_overlay = self._make_overlay((80, 0, 0, 190))
+        # End-screen text never changes: render once, position once
+        center_x = self.screen_width / 2; center_y = self.screen_height / 2
+        self._win_text = self.end_message_font.render("You Win!", True, (100, 255, 100)); self._win_rect = self._win_text.get_rect(center=(center_x, center_y - 30))
+        self._go_text = self.end_message_font.render("Game Over", True, (255, 80, 80)); self._go_rect = self._go_text.get_rect(center=(center_x, center_y - 30))
+        self._enter_text = self.info_font.render("Press Enter to return to Editor", True, (200, 200, 200)); self._enter_rect = self._enter_text.get_rect(center=(center_x, center_y + 40))
+
+    def _make_overlay(self, rgba):
+        """ Screen-sized translucent surface filled with rgba. """
+        overlay_surf = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA); overlay_surf.fill(rgba)
+        return overlay_surf.convert_alpha()
 
     def enter_state(self, previous_state_data=None):
         super().enter_state()
         if previous_state_data and isinstance(previous_state_data.get('game_world'), GameWorld):
-            self.game_world = previous_state_data['game_world']; print("PlayingState received existing GameWorld.")
+            self.game_world = previous_state_data['game_world']; log.debug("PlayingState received existing GameWorld.")
         self.game_world.set_gravity((0, 980))
         spawn_pos = self.game_world.get_spawn_position()
         if not self.game_world.player: self.game_world.add_player(spawn_pos)
@@ -32,9 +52,10 @@ class PlayingState(BaseState):
         self.game_world.player_needs_respawn = False
         self._game_over = False; self._level_won = False
         self.game_world.update_camera(force_center=True); pygame.display.set_caption("Playing Mode")
+        pygame.event.set_blocked(None); pygame.event.set_allowed(PLAYING_EVENT_TYPES) # SDL drops mouse motion etc. that play mode ignores
 
     def exit_state(self):
-        super().exit_state()
+        super().exit_state(); pygame.event.set_allowed(None) # Next state gets the full event stream again
         # Stop player sound effects etc. if any
         return {'game_world': self.game_world} # Pass world back
 
@@ -63,59 +84,57 @@ class PlayingState(BaseState):
     # --- MODIFIED update method ---
     def update(self, dt):
         """Update gameplay logic."""
+        gw = self.game_world; player = gw.player # The player object is never replaced during a frame
         # Freeze screen if game is over or won, waiting for Enter
         if self._game_over or self._level_won:
             # We might still want player animation to finish?
             # If player exists and is dead, let animation update
-            if self.game_world.player and self.game_world.player.is_dead:
-                self.game_world.player.update_animation(dt)
+            if player and player.is_dead:
+                player.update_animation(dt)
             return # Skip game logic updates
 
-        keys = pygame.key.get_pressed()
-
         # Reset respawn flag before update
-        self.game_world.player_needs_respawn = False
+        gw.player_needs_respawn = False
 
-        # Update Player Input & State
-        if self.game_world.player:
-            self.game_world.update_player_state(dt, keys)
+        # Update Player Input & State (keyboard snapshot taken only when a player will read it; passed through, never re-queried)
+        if player:
+            gw.update_player_state(dt, pygame.key.get_pressed())
 
         # Step Physics (Collision handlers run here, may set flags)
-        self.game_world.step_physics(dt)
+        gw.step_physics(dt)
 
         # --- Handle Deferred Actions AFTER Physics Step ---
         # 1. Handle non-fatal respawn if flagged
-        if self.game_world.player_needs_respawn:
-            self.game_world.respawn_player() # Teleport without health reset
-            self.game_world.player_needs_respawn = False # Reset flag
+        if gw.player_needs_respawn:
+            gw.respawn_player() # Teleport without health reset
+            gw.player_needs_respawn = False # Reset flag
 
         # --- Check Game End Conditions AFTER potential respawn ---
-        player_alive_and_exists = self.game_world.player and not self.game_world.player.is_dead
-
-        # 2. Check if player IS dead AND death animation finished
-        if self.game_world.player and self.game_world.player.is_dead and self.game_world.player.animation_finished:
-             print("Game Over Transition (Death Anim Finished)")
-             self._game_over = True
-             return # Freeze game loop
-
-        # 3. Check fall condition (only if player alive)
-        if player_alive_and_exists and self.game_world.check_fall_condition():
-             print("Game Over Transition (Fell)")
-             self.game_world.player.is_dead = True # Mark as dead if fell
-             self.game_world.player.set_animation("death") # Trigger death anim (optional for falling)
+        if not player: return # Nothing below applies without a player
+        if player.is_dead:
+            # 2. Game over once the death animation finished
+            if player.animation_finished:
+                log.debug("Game Over Transition (Death Anim Finished)")
+                self._game_over = True
+            return # Freeze game loop / let animation play
+
+        # 3. Check fall condition (player alive from here on)
+        if gw.check_fall_condition():
+             log.debug("Game Over Transition (Fell)")
+             player.is_dead = True # Mark as dead if fell
+             player.set_animation("death") # Trigger death anim (optional for falling)
              # Game over screen will appear after animation finishes next frame
              return # Let animation play
 
-        # 4. Check win condition (only if player alive)
-        if player_alive_and_exists and self.game_world.check_win_condition():
-             print("Win Transition")
+        # 4. Check win condition
+        if gw.check_win_condition():
+             log.debug("Win Transition")
              self._level_won = True
              return # Freeze game loop
 
         # --- Update Camera, Checkpoints (only if game not ended) ---
-        if player_alive_and_exists:
-             self.game_world.update_camera()
-             self.game_world.update_checkpoints()
+        gw.update_camera()
+        gw.update_checkpoints()
 
 
     def draw(self, screen):
@@ -127,14 +146,12 @@ class PlayingState(BaseState):
         # --- Draw Win/Game Over Overlays ---
         overlay_drawn = False
         if self._level_won:
-            overlay_surf = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA); overlay_surf.fill((50, 50, 50, 180)); screen.blit(overlay_surf, (0, 0))
-            win_text = self.end_message_font.render("You Win!", True, (100, 255, 100)); win_rect = win_text.get_rect(center=(self.screen_width / 2, self.screen_height / 2 - 30)); screen.blit(win_text, win_rect)
-            enter_text = self.info_font.render("Press Enter to return to Editor", True, (200, 200, 200)); enter_rect = enter_text.get_rect(center=(self.screen_width / 2, self.screen_height / 2 + 40)); screen.blit(enter_text, enter_rect)
+            screen.blit(self._win_overlay, (0, 0))
+            screen.blit(self._win_text, self._win_rect); screen.blit(self._enter_text, self._enter_rect)
             overlay_drawn = True
         # Show Game Over screen only AFTER death animation finishes
         if self._game_over:
              # We could check player.animation_finished here again, but _game_over flag
              # is only set after the animation is done in update()
-             if not overlay_drawn: overlay_surf = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA); overlay_surf.fill((80, 0, 0, 190)); screen.blit(overlay_surf, (0, 0))
-             game_over_text = self.end_message_font.render("Game Over", True, (255, 80, 80)); go_rect = game_over_text.get_rect(center=(self.screen_width / 2, self.screen_height / 2 - 30)); screen.blit(game_over_text, go_rect)
-             enter_text = self.info_font.render("Press Enter to return to Editor", True, (200, 200, 200)); enter_rect = enter_text.get_rect(center=(self.screen_width / 2, self.screen_height / 2 + 40)); screen.blit(enter_text, enter_rect)
\ No newline at end of file
+             if not overlay_drawn: screen.blit(self._gameover_overlay, (0, 0))
+             screen.blit(self._go_text, self._go_rect); screen.blit(self._enter_text, self._enter_rect)
\ No newline at end of file
@@ -1,10 +1,15 @@
 # toolbar.py
+import logging
 import pygame
 
+log = logging.getLogger(__name__)
+
 # Keep constants at module level
 BUTTON_HEIGHT = 40
 BUTTON_WIDTH = 100
 TOOLBAR_HEIGHT = 60
+BUTTONS_LEFT = 10; BUTTONS_TOP = 10 # Top-left of the first button
+BUTTON_STRIDE = BUTTON_WIDTH + 10 # Button width plus gap: button i starts at BUTTONS_LEFT + i * BUTTON_STRIDE
 
 SELECTED_TOOL_COLOR = (80, 80, 150)
 BUTTON_COLOR = (100, 100, 100)
@@ -12,63 +17,78 @@ BUTTON_COLOR = (100, 100, 100)
 # PROPERTY_INACTIVE_COLOR = BUTTON_COLOR # No longer needed
 
 class Toolbar:
+    _font = None # Label font shared across Toolbar instances (a new one is built each time the editor is entered)
+
     def __init__(self):
         if not pygame.font.get_init(): pygame.font.init()
-        self.font = pygame.font.SysFont('arial', 18)
-        self.buttons = []
+        if Toolbar._font is None: Toolbar._font = pygame.font.SysFont('arial', 18)
+        self.font = Toolbar._font
+        # Buttons as parallel lists (index i is one button): rects, labels and the baked normal/selected faces
+        self._rects = []; self._labels = []; self._surfs_normal = []; self._surfs_selected = []
+        self._strip = None # Grey background with every button in its normal look, composited once per screen width
         self.selected_tool = 'Select'
+        self._deselect_cb = None # Called with the new tool after a tool change (set once by the editor)
         # --- Removed current_properties as they are shape-specific now ---
         # self.current_properties = {'Danger': False, 'Spinning': False, 'Sticky': False}
         self.create_buttons()
 
     def create_buttons(self):
-        self.buttons = [] # Clear existing buttons
+        self._rects = []; self._labels = []; self._surfs_normal = []; self._surfs_selected = [] # Clear existing buttons
+        self._strip = None # Rebuilt on next draw
         # --- Only Tool Buttons ---
         tools = ['Select', 'Rectangle', 'Circle', 'Triangle', 'Start', 'End', 'Checkpoint']
-        x = 10
+        x = BUTTONS_LEFT
 
         for tool in tools:
             width = BUTTON_WIDTH
-            self.buttons.append({'rect': pygame.Rect(x, 10, width, BUTTON_HEIGHT), 'label': tool, 'type': 'tool'})
-            x += width + 10
+            self._rects.append(pygame.Rect(x, BUTTONS_TOP, width, BUTTON_HEIGHT)); self._labels.append(tool)
+            # Fill + label (+ yellow border when selected) baked once; drawing is then a single blits call
+            self._surfs_normal.append(self._render_button(tool, width, BUTTON_COLOR, False)); self._surfs_selected.append(self._render_button(tool, width, SELECTED_TOOL_COLOR, True))
+            x += BUTTON_STRIDE
 
         # --- NO Property Buttons Added ---
 
     def handle_event(self, event, editor_state_context):
         if event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_pos = pygame.mouse.get_pos()
-            if mouse_pos[1] <= TOOLBAR_HEIGHT:
-                for button in self.buttons:
-                    if button['rect'].collidepoint(mouse_pos):
-                        # --- Only handle TOOL clicks ---
-                        if button['type'] == 'tool':
-                            new_tool = button['label']
-                            if self.selected_tool != new_tool:
-                                self.selected_tool = new_tool
-                                print(f"Toolbar: Tool selected: {self.selected_tool}")
-                                if hasattr(editor_state_context, '_deselect_shape_if_needed'):
-                                     editor_state_context._deselect_shape_if_needed(self.selected_tool)
-                        # --- NO Property Click Handling ---
-                        break # Button handled
+            mx, my = event.pos
+            if BUTTONS_TOP <= my < BUTTONS_TOP + BUTTON_HEIGHT: # Inside the toolbar strip and the button row
+                # Buttons form one evenly spaced row, so the hit button is an index computation rather than a scan
+                idx, rem = divmod(mx - BUTTONS_LEFT, BUTTON_STRIDE)
+                if 0 <= idx < len(self._labels) and rem < BUTTON_WIDTH:
+                    # --- Every button is a tool ---
+                    new_tool = self._labels[idx]
+                    if self.selected_tool != new_tool:
+                        self.selected_tool = new_tool
+                        log.debug("Toolbar: Tool selected: %s", self.selected_tool)
+                        if self._deselect_cb is not None: self._deselect_cb(self.selected_tool)
+                    # --- NO Property Click Handling ---
+
+    def set_deselect_callback(self, callback): self._deselect_cb = callback
 
     def set_active_tool(self, tool_name):
-         if any(b['label'] == tool_name and b['type'] == 'tool' for b in self.buttons):
+         if tool_name in self._labels:
               if self.selected_tool != tool_name:
-                   print(f"Toolbar: Tool force set to: {tool_name}")
+                   log.debug("Toolbar: Tool force set to: %s", tool_name)
                    self.selected_tool = tool_name
-         else: print(f"Warning: Tried to set unknown tool '{tool_name}'")
+         else: log.warning("Tried to set unknown tool '%s'", tool_name)
+
+    def _render_button(self, label_text, width, color, selected):
+        """ Button face as an opaque surface: filled rect, centred white label, yellow border if selected. """
+        surf = pygame.Surface((width, BUTTON_HEIGHT)); surf.fill(color)
+        if selected: pygame.draw.rect(surf, (255, 255, 0), surf.get_rect(), 2)
+        label = self.font.render(label_text, True, (255, 255, 255)); surf.blit(label, label.get_rect(center=surf.get_rect().center).topleft)
+        return surf.convert()
+
+    def _render_strip(self, width):
+        """ Toolbar strip as one opaque surface: grey background plus every button face in its normal look. """
+        strip = pygame.Surface((width, TOOLBAR_HEIGHT)); strip.fill((180, 180, 180))
+        strip.blits([(surf_normal, rect.topleft) for rect, surf_normal in zip(self._rects, self._surfs_normal)], doreturn=False)
+        return strip.convert()
 
     def draw(self, screen, editor_state_context):
         # --- Simplified Draw (No property button state) ---
-        pygame.draw.rect(screen, (180, 180, 180), (0, 0, screen.get_width(), TOOLBAR_HEIGHT))
-        for button in self.buttons:
-            button_color = BUTTON_COLOR; is_selected = False
-            # --- Only check tool selection ---
-            if button['type'] == 'tool':
-                if self.selected_tool == button['label']:
-                    button_color = SELECTED_TOOL_COLOR; is_selected = True
-
-            pygame.draw.rect(screen, button_color, button['rect'])
-            if is_selected: pygame.draw.rect(screen, (255, 255, 0), button['rect'], 2)
-            label_color = (255, 255, 255); label = self.font.render(button['label'], True, label_color)
-            label_rect = label.get_rect(center=button['rect'].center); screen.blit(label, label_rect.topleft)
\ No newline at end of file
+        # One strip blit replaces fill + per-button blits; only the selected button's face is painted over it
+        if self._strip is None or self._strip.get_width() != screen.get_width(): self._strip = self._render_strip(screen.get_width())
+        screen.blit(self._strip, (0, 0))
+        if self.selected_tool in self._labels:
+            idx = self._labels.index(self.selected_tool); screen.blit(self._surfs_selected[idx], self._rects[idx].topleft)
@@ -1,10 +1,14 @@
 # ui_elements.py (or similar name)
+import logging
 import pygame
 import math
 from commands import (Command, PlaceShapeCommand, DeleteShapeCommand, MoveShapeCommand,
                       TogglePropertyCommand, ResizeShapeCommand, SetMarkerCommand,
                       AddCheckpointCommand, RemoveCheckpointCommand)
 
+# UI tracing goes through logging so disabled debug output costs no string formatting or stdout writes
+log = logging.getLogger(__name__)
+
 # Constants for the Radial Menu
 RADIAL_MENU_RADIUS = 60
 BUTTON_RADIUS = 20
@@ -12,49 +16,55 @@ BUTTON_COLOR = (80, 80, 120)
 BUTTON_HOVER_COLOR = (110, 110, 160)
 BUTTON_BORDER_COLOR = (200, 200, 255)
 ICON_COLOR = (255, 255, 255)
+HAS_FBLITS = hasattr(pygame.Surface, 'fblits') # pygame-ce's faster batched blit
+# Squared distance bounds of every button's rect from the menu center (inner edge midpoint, outer corner; +1 for rounding)
+RING_INNER_2 = (RADIAL_MENU_RADIUS - BUTTON_RADIUS - 1) ** 2
+RING_OUTER_2 = (RADIAL_MENU_RADIUS + BUTTON_RADIUS + 1) ** 2 + (BUTTON_RADIUS + 1) ** 2
 
 class RadialMenuButton:
     """ Represents a single button within the radial menu. """
-    def __init__(self, id, icon_char, angle_degrees, command_func):
+    _font = None # Icon font shared by every button, loaded on first use
+
+    @classmethod
+    def _get_font(cls):
+        """ The shared icon font; SysFont's system font lookup runs once, not once per button. """
+        if cls._font is None: cls._font = pygame.font.SysFont('arial', 18, bold=True)
+        return cls._font
+
+    def __init__(self, id, icon_char, angle_degrees, command_func, command_arg=None):
         self.id = id # e.g., "toggle_danger", "delete"
         self.icon_char = icon_char # Character to display (e.g., 'D', 'S', 'X')
         self.angle_degrees = angle_degrees # Position on the wheel
-        self.command_func = command_func # Function to call when clicked (will execute a command)
+        self.command_func = command_func # Called as command_func(command_arg) when clicked (will execute a command)
+        self.command_arg = command_arg # e.g. the property name a toggle button flips
         self.rect = pygame.Rect(0, 0, BUTTON_RADIUS * 2, BUTTON_RADIUS * 2)
+        # Fixed integer offset from the menu center (trig done once here), so placing the button is two integer adds.
+        # Floored, which matches int(center + offset) for the integer screen centers the editor passes
+        rad = math.radians(angle_degrees) # Pygame Y is down, but sin works correctly mathematically
+        self.offset_x = math.floor(RADIAL_MENU_RADIUS * math.cos(rad)); self.offset_y = math.floor(RADIAL_MENU_RADIUS * math.sin(rad))
         self.is_hovered = False
-        self.font = pygame.font.SysFont('arial', 18, bold=True) # Font for icon
+        # Whole button (circle, border, icon) baked once per look; drawing is then a single blit
+        self._surf_normal = self._render_surface(BUTTON_COLOR); self._surf_hover = self._render_surface(BUTTON_HOVER_COLOR)
+        self._cached_topleft = (0, 0); self.update_pos(0, 0)
 
     def update_pos(self, center_x, center_y):
         """ Calculates the button's screen position based on the menu center and angle. """
-        rad = math.radians(self.angle_degrees)
-        offset_x = RADIAL_MENU_RADIUS * math.cos(rad)
-        offset_y = RADIAL_MENU_RADIUS * math.sin(rad) # Pygame Y is down, but sin works correctly mathematically
-        self.rect.center = (int(center_x + offset_x), int(center_y + offset_y))
+        self.rect.center = (center_x + self.offset_x, center_y + self.offset_y)
+        half = self._surf_normal.get_width() // 2; self._cached_topleft = (self.rect.centerx - half, self.rect.centery - half) # Blit position of either baked surface
 
-    def draw(self, screen):
-        """ Draws the button. """
-        color = BUTTON_HOVER_COLOR if self.is_hovered else BUTTON_COLOR
-        pygame.draw.circle(screen, color, self.rect.center, BUTTON_RADIUS)
-        pygame.draw.circle(screen, BUTTON_BORDER_COLOR, self.rect.center, BUTTON_RADIUS, 2)
-
-        # Draw icon character
-        icon_surf = self.font.render(self.icon_char, True, ICON_COLOR)
-        icon_rect = icon_surf.get_rect(center=self.rect.center)
-        screen.blit(icon_surf, icon_rect)
-
-    def handle_event(self, event, target_shape):
-        """ Checks for hover and click events. Returns True if clicked. """
-        self.is_hovered = False
-        if event.type == pygame.MOUSEMOTION:
-            if self.rect.collidepoint(event.pos):
-                self.is_hovered = True
-        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            if self.rect.collidepoint(event.pos):
-                print(f"Radial button '{self.id}' clicked!")
-                if self.command_func:
-                     self.command_func(target_shape) # Execute the associated command function
-                return True # Click handled
-        return False
+    def _render_surface(self, color):
+        """ Transparent surface holding the filled circle, its border and the icon character, centred. """
+        size = BUTTON_RADIUS * 2 + 4; center = (size // 2, size // 2)
+        surf = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(surf, color, center, BUTTON_RADIUS)
+        pygame.draw.circle(surf, BUTTON_BORDER_COLOR, center, BUTTON_RADIUS, 2)
+        icon_surf = self._get_font().render(self.icon_char, True, ICON_COLOR)
+        surf.blit(icon_surf, icon_surf.get_rect(center=center))
+        return surf.convert_alpha()
+
+    def blit_item(self):
+        """ (surface, topleft) for the button's current look, ready for a batched blits / fblits call. """
+        return (self._surf_hover if self.is_hovered else self._surf_normal, self._cached_topleft)
 
 
 class RadialMenu:
@@ -69,72 +79,86 @@ class RadialMenu:
 
     def _setup_buttons(self):
         """ Create the buttons and their actions. """
-        # Define actions using lambda functions that create and execute commands
-        # Need to access editor_state to execute commands
-        def create_toggle_cmd(prop):
-            if self.target_shape:
-                 # Create command using the state's method to handle undo stack
-                 command = TogglePropertyCommand(self.editor_state, self.target_shape, prop)
-                 self.editor_state.execute_command(command)
-            self.hide() # Hide menu after action
-
-        def create_delete_cmd():
-            if self.target_shape:
-                 command = DeleteShapeCommand(self.editor_state, self.target_shape)
-                 self.editor_state.execute_command(command)
-                 # Target shape is now gone, selection cleared by command execute
-            self.hide()
-
+        # Actions are bound methods plus a fixed argument (no per-button closures)
         # Add buttons (Angles: 0=East, 90=South, 180=West, 270=North)
-        self.buttons.append(RadialMenuButton("toggle_danger", "D", 270, lambda s: create_toggle_cmd("Danger")))
-        self.buttons.append(RadialMenuButton("toggle_spinning", "S", 0, lambda s: create_toggle_cmd("Spinning")))
-        self.buttons.append(RadialMenuButton("toggle_sticky", "T", 90, lambda s: create_toggle_cmd("Sticky"))) # 'T' for Sticky/Texture?
-        self.buttons.append(RadialMenuButton("delete", "X", 180, lambda s: create_delete_cmd()))
+        self.buttons.append(RadialMenuButton("toggle_danger", "D", 270, self._on_toggle, "Danger"))
+        self.buttons.append(RadialMenuButton("toggle_spinning", "S", 0, self._on_toggle, "Spinning"))
+        self.buttons.append(RadialMenuButton("toggle_sticky", "T", 90, self._on_toggle, "Sticky")) # 'T' for Sticky/Texture?
+        self.buttons.append(RadialMenuButton("delete", "X", 180, self._on_delete))
         # Add more buttons as needed (e.g., duplicate, properties panel)
+        # Buttons are evenly spaced around the ring: angular sector -> button, for O(1) hit tests
+        self._sector_count = len(self.buttons); self._sector_degrees = 360 / self._sector_count
+        self._button_by_sector = {round(button.angle_degrees / self._sector_degrees) % self._sector_count: button for button in self.buttons}
+
+    def _on_toggle(self, prop):
+        """ Toggle prop on the target shape through the editor's undo history, then hide. """
+        if self.target_shape:
+             # Create command using the state's method to handle undo stack
+             command = TogglePropertyCommand(self.editor_state, self.target_shape, prop)
+             self.editor_state.execute_command(command)
+        self.hide() # Hide menu after action
+
+    def _on_delete(self, _arg=None):
+        """ Delete the target shape through the editor's undo history, then hide. """
+        if self.target_shape:
+             command = DeleteShapeCommand(self.editor_state, self.target_shape)
+             self.editor_state.execute_command(command)
+             # Target shape is now gone, selection cleared by command execute
+        self.hide()
 
     def show(self, screen_position, target_shape):
         """ Make the menu visible at a specific screen location for a target shape. """
-        print(f"Showing radial menu for shape at screen pos: {screen_position}")
-        self.is_visible = True
-        self.screen_center = screen_position
-        self.target_shape = target_shape
-        # Update button positions based on the new center
-        for button in self.buttons:
-            button.update_pos(self.screen_center[0], self.screen_center[1])
+        if self.is_visible and self.target_shape is target_shape and self.screen_center == screen_position: return # Already open there, buttons are placed
+        log.debug("Showing radial menu for shape at screen pos: %s", screen_position)
+        self.update_target(screen_position, target_shape)
+
+    def update_target(self, screen_position, target_shape):
+        """ Makes the menu visible for target_shape at screen_position, reusing the button rects; they only move if the center changed. """
+        self.is_visible = True; self.target_shape = target_shape
+        if self.screen_center != screen_position:
+            self.screen_center = screen_position; center_x, center_y = screen_position
+            for button in self.buttons: button.update_pos(center_x, center_y)
+
+    def get_rect(self):
+        """ Screen rect covering all buttons while visible, else None. """
+        if not self.is_visible or not self.buttons: return None
+        return self.buttons[0].rect.unionall([button.rect for button in self.buttons[1:]])
 
     def hide(self):
         """ Hide the menu. """
         if self.is_visible:
-            print("Hiding radial menu.")
+            log.debug("Hiding radial menu.")
             self.is_visible = False
             self.target_shape = None
             # Reset hover state
             for button in self.buttons:
                  button.is_hovered = False
 
+    def _button_at(self, pos):
+        """ Button under screen position pos, or None. Distance from the center rejects clicks off the ring; the angle picks the one candidate. """
+        dx = pos[0] - self.screen_center[0]; dy = pos[1] - self.screen_center[1]; d2 = dx * dx + dy * dy
+        if d2 < RING_INNER_2 or d2 > RING_OUTER_2: return None
+        button = self._button_by_sector.get(round(math.degrees(math.atan2(dy, dx)) / self._sector_degrees) % self._sector_count)
+        return button if button and button.rect.collidepoint(pos) else None
+
     def handle_event(self, event):
         """ Process events if the menu is visible. Returns True if event was handled. """
         if not self.is_visible:
             return False
 
-        # Check button interactions first
-        for button in self.buttons:
-            if button.handle_event(event, self.target_shape):
+        etype = event.type
+        if etype != pygame.MOUSEMOTION and etype != pygame.MOUSEBUTTONDOWN: return False # Keys, mouse-up etc. never touch the buttons
+        hit = self._button_at(event.pos)
+        if etype == pygame.MOUSEMOTION:
+            for button in self.buttons: button.is_hovered = button is hit
+        elif event.button == 1: # MOUSEBUTTONDOWN
+            if hit: # Check button interactions first
+                log.debug("Radial button '%s' clicked!", hit.id)
+                if hit.command_func:
+                     hit.command_func(hit.command_arg) # Execute the associated command function
                 return True # Event handled by a button click
-
-        # Optional: Hide menu if clicking *outside* its buttons while visible?
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-             # Check if click was outside all button rects
-             mouse_pos = event.pos
-             clicked_outside = True
-             for button in self.buttons:
-                  if button.rect.collidepoint(mouse_pos):
-                       clicked_outside = False
-                       break
-             if clicked_outside:
-                  self.hide()
-                  # Don't consume the event here, let EditorState handle deselection/selection
-                  # return True # Or return False to allow deselection? Let's return False.
+            # Clicked outside the buttons: hide, but don't consume the event so EditorState handles deselection/selection
+            self.hide()
 
         return False # Event not handled by the menu itself
 
@@ -146,6 +170,7 @@ class RadialMenu:
         # Optional: Draw semi-transparent background circle?
         # pygame.draw.circle(screen, (50, 50, 50, 150), self.screen_center, RADIAL_MENU_RADIUS + BUTTON_RADIUS + 5)
 
-        # Draw buttons
-        for button in self.buttons:
-            button.draw(screen)
+        # All buttons in one batched call (fblits on pygame-ce, blits otherwise); positions were cached by update_pos
+        seq = [button.blit_item() for button in self.buttons]
+        if HAS_FBLITS: screen.fblits(seq)
+        else: screen.blits(seq, doreturn=False)